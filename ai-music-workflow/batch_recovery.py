@@ -46,19 +46,24 @@ def list_batches(workflow_type='cd'):
     print(f"ACTIVE BATCHES ({workflow_type.upper()} workflow)")
     print(f"{'='*80}\n")
 
+    timestamp_format = '%Y-%m-%d %H:%M:%S'
+
     for batch in active_batches:
-        print(f"Batch ID: {batch['batch_id']}")
-        print(f"  Status: {batch['status']}")
-        print(f"  Description: {batch['description']}")
-        print(f"  Request Count: {batch['request_count']}")
+        lines = [
+            f"Batch ID: {batch['batch_id']}",
+            f"  Status: {batch['status']}",
+            f"  Description: {batch['description']}",
+            f"  Request Count: {batch['request_count']}",
+        ]
 
         created_at = batch.get('created_at')
         if created_at:
             if isinstance(created_at, str):
                 created_at = datetime.fromisoformat(created_at)
-            print(f"  Created: {created_at.strftime('%Y-%m-%d %H:%M:%S')}")
+            lines.append(f"  Created: {created_at.strftime(timestamp_format)}")
 
-        print()
+        # One write per batch instead of one per field
+        print("\n".join(lines) + "\n")
 
 def resume_batch(batch_id, workflow_type='cd'):
     """Resume an interrupted batch."""
@@ -4,45 +4,147 @@ Alma API Utilities for Holdings Verification
 Provides functions to verify if OCLC numbers exist in Alma,
 used to replace unreliable OCLC holdings data.
 
-Key function:
+Key functions:
     check_oclc_in_alma(oclc_number) -> (exists: bool, mms_id: str | None)
+    check_oclcs_in_alma_batch(oclc_numbers) -> {oclc_number: mms_id | None}
 
 Environment Variables:
     ALMA_SANDBOX_API_KEY - Required for API authentication
     ALMA_REGION - Optional, defaults to "api-na" (North America)
+    ALMA_OCLC_FALLBACK_FORMAT - Optional; also search ocm/ocn/on/bare forms when set
 """
 
 import os
+import json
 import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from functools import lru_cache
 import requests
-import xml.etree.ElementTree as ET
+from requests.adapters import HTTPAdapter
 from datetime import datetime
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
+
+# Lookups ask Alma for JSON; orjson decodes it several times faster when installed
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 
 class AlmaRateLimiter:
-    """Rate limiter to stay within Alma API limits (20 req/sec)."""
+    """
+    Token-bucket rate limiter to stay within Alma API limits (20 req/sec).
+
+    The bucket holds up to `burst` tokens and refills continuously at
+    max_requests_per_second. A call only sleeps when the bucket is empty, so idle
+    time between requests is not wasted. Any one-second window can see
+    burst + max_requests_per_second calls, so the default burst is kept to a
+    quarter second's worth.
+
+    Time comes from time.monotonic(), so wall-clock adjustments cannot open or
+    stall the bucket. When it is empty, a caller reserves the next refill under
+    the lock (the balance goes negative) and sleeps after releasing it, so
+    waiting threads queue up at 1/rate spacing without holding the lock.
+    """
 
-    def __init__(self, max_requests_per_second: int = 20):
-        self.min_interval = 1.0 / max_requests_per_second
-        self.last_request_time = 0.0
+    def __init__(self, max_requests_per_second: int = 20, burst: Optional[int] = None):
+        self.rate = float(max_requests_per_second)
+        self.capacity = float(burst or max(1, max_requests_per_second // 4))
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        # Shared by worker threads; the bucket is only read and updated under the lock
+        self._lock = threading.Lock()
 
     def wait_if_needed(self):
-        """Wait if necessary to avoid exceeding rate limit."""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.min_interval:
-            time.sleep(self.min_interval - elapsed)
-        self.last_request_time = time.time()
+        """Take one token, waiting for the bucket to refill if it is empty."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
 
 
 # Global rate limiter instance
 _rate_limiter = AlmaRateLimiter()
 
+# Shared session so repeated lookups reuse the keep-alive TCP+TLS connection to Alma.
+# Retries stay in _alma_request_with_retry (max_retries=0 here).
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=0))
+
+
+# Definitive lookup results for this process: normalized OCLC number -> (exists, mms_id)
+_OCLC_CACHE_MAX_ENTRIES = 4096
+_oclc_cache: "OrderedDict[str, Tuple[bool, Optional[str]]]" = OrderedDict()
+_oclc_cache_lock = threading.Lock()
+
+# Matches found in Alma persist across runs for a week. Misses are never written to
+# disk, so a bib imported after a check is picked up on the next run.
+OCLC_DISK_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "alma_oclc.db")
+OCLC_DISK_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def _oclc_cache_get(key: str) -> Optional[Tuple[bool, Optional[str]]]:
+    """Return a cached (exists, mms_id) from memory, then disk, or None."""
+    with _oclc_cache_lock:
+        if key in _oclc_cache:
+            _oclc_cache.move_to_end(key)
+            return _oclc_cache[key]
+
+    try:
+        with closing(sqlite3.connect(OCLC_DISK_CACHE_PATH, timeout=10)) as conn:
+            row = conn.execute(
+                "SELECT mms_id FROM oclc WHERE oclc = ? AND checked_at > ?",
+                (key, time.time() - OCLC_DISK_CACHE_TTL_SECONDS)
+            ).fetchone()
+    except sqlite3.Error:
+        return None
 
+    if row is None:
+        return None
+    result = (True, row[0])
+    _oclc_cache_put(key, result, persist=False)
+    return result
+
+
+def _oclc_cache_put(key: str, result: Tuple[bool, Optional[str]], persist: bool = True):
+    """Remember a definitive lookup result; matches are also written to the disk cache."""
+    with _oclc_cache_lock:
+        _oclc_cache[key] = result
+        _oclc_cache.move_to_end(key)
+        if len(_oclc_cache) > _OCLC_CACHE_MAX_ENTRIES:
+            _oclc_cache.popitem(last=False)
+
+    exists, mms_id = result
+    if not (persist and exists):
+        return
+    try:
+        os.makedirs(os.path.dirname(OCLC_DISK_CACHE_PATH), exist_ok=True)
+        with closing(sqlite3.connect(OCLC_DISK_CACHE_PATH, timeout=10)) as conn:
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS oclc "
+                             "(oclc TEXT PRIMARY KEY, mms_id TEXT, checked_at REAL)")
+                conn.execute("INSERT OR REPLACE INTO oclc VALUES (?, ?, ?)",
+                             (key, mms_id, time.time()))
+    except (OSError, sqlite3.Error) as e:
+        print(f"Could not write Alma OCLC cache: {e}")
+
+
+@lru_cache(maxsize=1)
 def get_alma_config() -> Dict[str, str]:
     """
     Load Alma API configuration from environment variables.
 
+    The environment is read once; later calls return the same dict (a missing
+    key is not cached, so it is re-checked on the next call).
+
     Returns:
         Dict with 'api_key', 'region', and 'base_url'
 
@@ -63,11 +165,17 @@ def get_alma_config() -> Dict[str, str]:
     }
 
 
-def get_alma_headers(api_key: str) -> Dict[str, str]:
-    """Return standard headers for Alma XML API."""
+@lru_cache(maxsize=4)
+def get_alma_headers(api_key: str, accept: str = "application/xml") -> Dict[str, str]:
+    """
+    Return standard headers for Alma XML API (one shared dict per combination; do not mutate).
+
+    Pass accept="application/json" for read endpoints whose response is parsed
+    as JSON; request bodies stay XML either way.
+    """
     return {
         "Authorization": f"apikey {api_key}",
-        "Accept": "application/xml",
+        "Accept": accept,
         "Content-Type": "application/xml"
     }
 
@@ -95,7 +203,7 @@ def _alma_request_with_retry(
     for attempt in range(max_retries):
         try:
             _rate_limiter.wait_if_needed()
-            response = requests.get(url, headers=headers, params=params, timeout=timeout)
+            response = _SESSION.get(url, headers=headers, params=params, timeout=timeout)
 
             if response.status_code == 429:  # Rate limited
                 wait_time = 30 * (2 ** attempt)
@@ -161,7 +269,15 @@ def _extract_oclc_from_network_number(network_number: str) -> Optional[str]:
     return None
 
 
-def _verify_oclc_in_bib(bib_element, target_oclc: str) -> bool:
+def _bib_network_numbers(bib: Dict[str, Any]) -> List[str]:
+    """Return a JSON bib's network numbers as a list (Alma sends a bare string when there is one)."""
+    network_numbers = bib.get('network_number') or []
+    if isinstance(network_numbers, str):
+        return [network_numbers]
+    return network_numbers
+
+
+def _verify_oclc_in_bib(bib: Dict[str, Any], target_oclc: str) -> bool:
     """
     Verify that a bib record actually contains the target OCLC number.
 
@@ -170,7 +286,7 @@ def _verify_oclc_in_bib(bib_element, target_oclc: str) -> bool:
     This function checks the network_numbers to confirm the match.
 
     Args:
-        bib_element: The <bib> XML element from Alma response
+        bib: One entry of the "bib" list in Alma's JSON response
         target_oclc: The OCLC number we're looking for (numeric only)
 
     Returns:
@@ -179,19 +295,48 @@ def _verify_oclc_in_bib(bib_element, target_oclc: str) -> bool:
     # Normalize target - remove leading zeros for comparison
     target_normalized = target_oclc.lstrip('0')
 
-    network_numbers = bib_element.find('network_numbers')
-    if network_numbers is None:
-        return False
-
-    for nn_elem in network_numbers.findall('network_number'):
-        if nn_elem.text:
-            extracted_oclc = _extract_oclc_from_network_number(nn_elem.text)
-            if extracted_oclc and extracted_oclc.lstrip('0') == target_normalized:
-                return True
+    for network_number in _bib_network_numbers(bib):
+        extracted_oclc = _extract_oclc_from_network_number(network_number)
+        if extracted_oclc and extracted_oclc.lstrip('0') == target_normalized:
+            return True
 
     return False
 
 
+# Alma indexes OCLC numbers as (OCoLC)N; also search ocm/ocn/on/bare forms (for migrated records) only if set
+OCLC_FALLBACK_FORMATS = os.environ.get("ALMA_OCLC_FALLBACK_FORMAT", "").lower() in ("1", "true", "yes")
+
+
+def normalize_oclc_number(oclc_number: str) -> str:
+    """Strip the (OCoLC) wrapper and any ocm/ocn/on prefix from an OCLC number."""
+    oclc_num = oclc_number.replace("(OCoLC)", "").strip()
+    for prefix in ['ocm', 'ocn', 'on']:
+        if oclc_num.startswith(prefix):
+            oclc_num = oclc_num[len(prefix):]
+            break
+    return oclc_num
+
+
+def oclc_search_formats(oclc_num: str) -> List[str]:
+    """
+    Forms to search an OCLC number under. The canonical (OCoLC) form finds nearly every
+    record; the older prefixes (ocm=older, ocn=post-2001, on=newest) and the bare number
+    are only tried when ALMA_OCLC_FALLBACK_FORMAT is set.
+
+    Every single and batched lookup builds its search terms here, so they all
+    agree on whether a number is in Alma.
+    """
+    if not OCLC_FALLBACK_FORMATS:
+        return [f"(OCoLC){oclc_num}"]
+    return [
+        f"(OCoLC){oclc_num}",
+        f"ocm{oclc_num}",
+        f"ocn{oclc_num}",
+        f"on{oclc_num}",
+        oclc_num
+    ]
+
+
 def check_oclc_in_alma(oclc_number: str) -> Tuple[bool, Optional[str]]:
     """
     Check if an OCLC number exists in Alma.
@@ -204,11 +349,23 @@ def check_oclc_in_alma(oclc_number: str) -> Tuple[bool, Optional[str]]:
     Args:
         oclc_number: OCLC number to search for (with or without prefix)
 
+    Results are cached in memory for the run, and matches on disk for a week
+    (see OCLC_DISK_CACHE_PATH), so repeat lookups skip the API entirely.
+
     Returns:
         Tuple of (exists: bool, mms_id: Optional[str])
         - exists: True if the OCLC number was found in Alma
         - mms_id: The MMS ID of the found record, or None if not found
     """
+    # Clean OCLC number - remove any existing prefix
+    oclc_num = normalize_oclc_number(oclc_number)
+
+    # (OCoLC)n, ocmn and bare n all share one cache entry; a hit needs no config or request
+    cache_key = oclc_num.lstrip('0')
+    cached = _oclc_cache_get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
         config = get_alma_config()
     except ValueError as e:
@@ -216,30 +373,13 @@ def check_oclc_in_alma(oclc_number: str) -> Tuple[bool, Optional[str]]:
         return False, None
 
     url = f"{config['base_url']}/bibs"
-    headers = get_alma_headers(config['api_key'])
-
-    # Clean OCLC number - remove any existing prefix
-    oclc_num = oclc_number.replace("(OCoLC)", "").strip()
-    for prefix in ['ocm', 'ocn', 'on']:
-        if oclc_num.startswith(prefix):
-            oclc_num = oclc_num[len(prefix):]
-            break
+    headers = get_alma_headers(config['api_key'], accept="application/json")
 
-    # Try multiple search formats - OCLC numbers in Alma's 035 field
-    # can use different prefix formats depending on when they were created:
-    # - ocm: older 8-digit OCLC numbers
-    # - ocn: newer OCLC numbers (post-2001)
-    # - on: most recent format
-    # - (OCoLC): OCLC organizational code format
-    search_formats = [
-        f"(OCoLC){oclc_num}",
-        f"ocm{oclc_num}",
-        f"ocn{oclc_num}",
-        f"on{oclc_num}",
-        oclc_num
-    ]
+    # Only cache an answer if every search completed; errors may hide a match
+    lookup_failed = False
 
-    for search_term in search_formats:
+    # Same search forms as check_oclcs_in_alma_batch (see oclc_search_formats)
+    for search_term in oclc_search_formats(oclc_num):
         params = {
             "other_system_id": search_term,
             "limit": "1"
@@ -249,6 +389,7 @@ def check_oclc_in_alma(oclc_number: str) -> Tuple[bool, Optional[str]]:
 
         if response is None:
             # API error - can't determine, return False
+            lookup_failed = True
             continue
 
         try:
@@ -258,30 +399,120 @@ def check_oclc_in_alma(oclc_number: str) -> Tuple[bool, Optional[str]]:
 
             response.raise_for_status()
 
-            root = ET.fromstring(response.text)
-            # total_record_count is an attribute on <bibs>, not a child element
-            total_records = root.get('total_record_count')
+            data = json_loads(response.content)
+            total_records = data.get('total_record_count')
 
             if total_records is not None and int(total_records) > 0:
-                bib = root.find('.//bib')
-                if bib is not None:
+                bibs = data.get('bib') or []
+                if bibs:
+                    bib = bibs[0]
                     # Verify this record actually contains our OCLC number
                     # (not just a partial match on a non-OCLC identifier)
                     if _verify_oclc_in_bib(bib, oclc_num):
-                        mms_id = bib.find('mms_id')
-                        if mms_id is not None:
-                            return True, mms_id.text
+                        mms_id = bib.get('mms_id')
+                        if mms_id:
+                            _oclc_cache_put(cache_key, (True, mms_id))
+                            return True, mms_id
 
         except requests.exceptions.HTTPError as e:
             print(f"Alma API error checking OCLC {oclc_number}: {e}")
+            lookup_failed = True
             continue
-        except ET.ParseError as e:
+        except ValueError as e:
             print(f"Error parsing Alma response for OCLC {oclc_number}: {e}")
+            lookup_failed = True
             continue
 
+    if not lookup_failed:
+        _oclc_cache_put(cache_key, (False, None))
     return False, None
 
 
+# Alma accepts up to 100 comma-separated IDs per /bibs lookup
+_BATCH_LOOKUP_CHUNK_SIZE = 100 // len(oclc_search_formats("0"))
+
+
+def check_oclcs_in_alma_batch(oclc_numbers: List[str], use_cache: bool = True) -> Dict[str, Optional[str]]:
+    """
+    Check many OCLC numbers in Alma using one /bibs request per chunk.
+
+    Each returned bib is verified through its network numbers (as in
+    check_oclc_in_alma) and the answers are stored in the lookup cache, so later
+    check_oclc_in_alma / verify_holdings_in_alma calls for these numbers make
+    no API request. Numbers in a chunk whose request failed are left out of the
+    result and of the cache; they are checked individually when asked for.
+
+    Args:
+        oclc_numbers: OCLC numbers (with or without prefix)
+        use_cache: Answer from the lookup cache where possible. Pass False when a
+            stale match would be costly (the upload script decides whether to
+            import from the answer); fresh answers are still cached.
+
+    Returns:
+        Dict mapping each successfully checked input number to its MMS ID, or None if not in Alma
+    """
+    try:
+        config = get_alma_config()
+    except ValueError as e:
+        print(f"Alma API not configured: {e}")
+        return {}
+
+    url = f"{config['base_url']}/bibs"
+    headers = get_alma_headers(config['api_key'], accept="application/json")
+    results: Dict[str, Optional[str]] = {}
+
+    # Normalized number (no prefix, no leading zeros) -> input spellings of it
+    pending: Dict[str, List[str]] = {}
+    for number in oclc_numbers:
+        key = normalize_oclc_number(number).lstrip('0')
+        if not key:
+            continue
+        cached = _oclc_cache_get(key) if use_cache else None
+        if cached is not None:
+            results[number] = cached[1]
+        else:
+            pending.setdefault(key, []).append(number)
+
+    keys = list(pending)
+    for start in range(0, len(keys), _BATCH_LOOKUP_CHUNK_SIZE):
+        chunk = keys[start:start + _BATCH_LOOKUP_CHUNK_SIZE]
+        search_terms = []
+        for key in chunk:
+            # Searched as the input spelled it (less any prefix), as check_oclc_in_alma does
+            search_terms.extend(oclc_search_formats(normalize_oclc_number(pending[key][0])))
+
+        response = _alma_request_with_retry(url, headers, {"other_system_id": ",".join(search_terms)},
+                                            timeout=120)
+        if response is None or response.status_code != 200:
+            status = "no response" if response is None else f"HTTP {response.status_code}"
+            print(f"Batched Alma lookup failed ({status}); {len(chunk)} OCLC numbers will be checked individually")
+            continue
+
+        try:
+            data = json_loads(response.content)
+        except ValueError as e:
+            print(f"Error parsing batched Alma response: {e}")
+            continue
+
+        found: Dict[str, str] = {}
+        for bib in data.get('bib') or []:
+            mms_id = bib.get('mms_id')
+            if not mms_id:
+                continue
+            for network_number in _bib_network_numbers(bib):
+                extracted_oclc = _extract_oclc_from_network_number(network_number)
+                if extracted_oclc and extracted_oclc in pending:
+                    found.setdefault(extracted_oclc, mms_id)
+
+        for key in chunk:
+            mms_id = found.get(key)
+            _oclc_cache_put(key, (mms_id is not None, mms_id))
+            for number in pending[key]:
+                results[number] = mms_id
+
+    return results
+
+
 def verify_holdings_in_alma(oclc_number: str) -> Dict[str, Any]:
     """
     Verify if institution holds this OCLC number in Alma.
@@ -14,7 +14,7 @@ WHAT IT DOES:
   • Writes a CSV of created IDs (MMS, holding, item) next to the input file
 
 USAGE:
-  python path/to/alma-batch-upload-script-cd.py path/to/input.txt [--delimiter '|'] [--yes] [--restrict-dir /expected/deliverables] [--report]
+  python path/to/alma-batch-upload-script-cd.py path/to/input.txt [--delimiter '|'] [--yes] [--restrict-dir /expected/deliverables] [--report] [--prefetch-existing]
 
 SAFETY:
   • File path is REQUIRED (no auto-detect).
@@ -22,6 +22,10 @@ SAFETY:
   • Use --yes to skip the prompt (non-interactive runs).
   • Optional: --report prints a summary in the terminal and exits (no other action taken).
   • Optional: --restrict-dir limits inputs to a known directory tree.
+  • Optional: --prefetch-existing refreshes the local OCLC -> MMS ID map (~/.cache/alma_oclc_map.json)
+    from an Analytics report; later runs reuse it and only query Alma for numbers not in it.
+    A map older than ALMA_OCLC_MAP_MAX_AGE_HOURS, or built from a different report
+    than ALMA_OCLC_MAP_REPORT, is ignored and every number is checked live.
 
 REQUIRED ENVIRONMENT VARIABLES:
   ALMA_SANDBOX_API_KEY  
@@ -35,17 +39,40 @@ REQUIRED ENVIRONMENT VARIABLES:
 OPTIONAL ENVIRONMENT VARIABLES:
   ALMA_REGION=api-na (default) 
   ALMA_INTERNAL_NOTE_2="AI-assisted cataloging"
+  ALMA_IMPORT_CONCURRENCY=10 (default; records processed in parallel)
+  ALMA_OCLC_FALLBACK_FORMAT=1 (also match ocm/ocn/on/bare OCLC numbers when checking Alma)
+  ALMA_OCLC_MAP_REPORT="/shared/.../OCLC to MMS" (Analytics report for --prefetch-existing;
+    columns: MMS Id, Network Number)
+  ALMA_OCLC_MAP_MAX_AGE_HOURS=24 (default; older prefetched maps are not used)
 
 """
 
 import os
 import re
+import sys
+import json
+import tempfile
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape as xml_escape
 import csv
 import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from functools import lru_cache
 import argparse
+from alma_api_utils import AlmaRateLimiter, check_oclcs_in_alma_batch, normalize_oclc_number, oclc_search_formats
+
+# orjson decodes the (often large) Discovery responses several times faster; optional
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 # ====== CONFIGURATION ======
 # Load from environment variables with validation
@@ -70,6 +97,9 @@ CATALOGING_INSTITUTION = get_required_env("ALMA_CATALOGING_INSTITUTION")
 ALMA_REGION = os.environ.get("ALMA_REGION", "api-na") # Default to North America
 INTERNAL_NOTE_2 = os.environ.get("ALMA_INTERNAL_NOTE_2", "AI-assisted cataloging")
 
+# Number of input lines processed concurrently (each record is several HTTP round-trips)
+MAX_CONCURRENT_RECORDS = max(1, int(os.environ.get("ALMA_IMPORT_CONCURRENCY", "10")))
+
 def validate_input_file(file_path):
     """Validate input file exists and is readable."""
     if not os.path.isfile(file_path):
@@ -88,23 +118,139 @@ HEADERS_XML = {
     "Content-Type": "application/xml"
 }
 
+class _RateLimitedSession(requests.Session):
+    """Session that waits on a shared AlmaRateLimiter before every request."""
+
+    def __init__(self, rate_limiter):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+
+    def request(self, *args, **kwargs):
+        self.rate_limiter.wait_if_needed()
+        return super().request(*args, **kwargs)
+
+class _RateLimitedRetry(Retry):
+    """
+    Retry that also takes a rate limiter token before each retry. urllib3 re-sends
+    inside the adapter, below _RateLimitedSession.request, so without this a burst of
+    429/5xx retries would bypass the limiter just when Alma is pushing back.
+    """
+
+    def __init__(self, *args, rate_limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def new(self, **kw):
+        # urllib3 builds a fresh Retry for every attempt; carry the limiter along
+        retry = super().new(**kw)
+        retry.rate_limiter = self.rate_limiter
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limiter:
+            self.rate_limiter.wait_if_needed()
+
+def _build_session(default_headers=None, rate_limiter=None):
+    """
+    Create a pooled session so repeated calls to the same host reuse the TCP+TLS connection.
+    Transient 429/5xx responses are retried with backoff (idempotent methods only, so
+    a bib/holding/item POST is never sent twice). With a rate_limiter, every attempt
+    from every worker thread, retries included, is throttled through it.
+    """
+    retry = _RateLimitedRetry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False,  # hand the final response to raise_for_status()
+        rate_limiter=rate_limiter,
+    )
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+    session = _RateLimitedSession(rate_limiter) if rate_limiter else requests.Session()
+    session.mount("https://", adapter)
+    if default_headers:
+        session.headers.update(default_headers)
+    return session
+
+# Shared across all records (and worker threads) for keep-alive reuse; Alma calls
+# are held to the API's per-second limit instead of sleeping between records
+ALMA_SESSION = _build_session(HEADERS_XML, rate_limiter=AlmaRateLimiter())
+OCLC_SESSION = _build_session()
+
+def get_batch_dates(now=None):
+    """
+    Date strings stamped into bibs, holdings and items. Computed once per run
+    and passed down instead of calling datetime.now().strftime() per record.
+    """
+    now = now or datetime.now()
+    return {
+        "timestamp_005": now.strftime('%Y%m%d%H%M%S.0'),  # MARC 005
+        "today_6": now.strftime('%y%m%d'),                # MARC/holding 008 date entered
+        "arrival_date": now.strftime('%Y-%m-%d') + "Z",   # item arrival date
+    }
+
 # ====== OCLC FUNCTIONS ======
 
-def get_access_token(client_id, client_secret):
-    """Get access token using wcapi scope"""
+# Tokens are cached on disk so repeat runs within the token lifetime skip the OAuth round-trip
+OCLC_TOKEN_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "oclc_token.json")
+
+def _read_cached_token(client_id):
+    """Return (token, expires_at) from the disk cache if it is still valid, else None."""
+    try:
+        with open(OCLC_TOKEN_CACHE_PATH, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("client_id") != client_id or time.time() >= cached.get("expires_at", 0):
+        return None
+    return cached["access_token"], cached["expires_at"]
+
+def _write_cached_token(client_id, token, expires_at):
+    """Atomically write the token cache (owner read/write only). Failures are non-fatal."""
+    cache_dir = os.path.dirname(OCLC_TOKEN_CACHE_PATH)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            os.chmod(tmp_path, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"client_id": client_id, "access_token": token, "expires_at": expires_at}, f)
+            os.replace(tmp_path, OCLC_TOKEN_CACHE_PATH)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    except OSError as e:
+        print(f"         WARNING: Could not cache OCLC token: {e}")
+
+def get_access_token_with_expiry(client_id, client_secret):
+    """Get a wcapi access token and its expiry (epoch seconds), reusing the disk cache when valid"""
+    cached = _read_cached_token(client_id)
+    if cached:
+        return cached
+
     token_url = "https://oauth.oclc.org/token"
     data = {
         "grant_type": "client_credentials",
         "scope": "wcapi"  
     }
-    response = requests.post(token_url, data=data, auth=(client_id, client_secret))
+    response = OCLC_SESSION.post(token_url, data=data, auth=(client_id, client_secret))
     if response.status_code == 200:
-        return response.json()["access_token"]
+        payload = response.json()
+        token = payload["access_token"]
+        # Treat the token as expired a minute early so in-flight requests don't get a 401
+        expires_at = time.time() + int(payload.get("expires_in", 1200)) - 60
+        _write_cached_token(client_id, token, expires_at)
+        return token, expires_at
     else:
         raise Exception(f"Failed to get access token: {response.text}")
 
+def get_access_token(client_id, client_secret):
+    """Get access token using wcapi scope"""
+    return get_access_token_with_expiry(client_id, client_secret)[0]
 
-def get_marcxml_from_oclc(oclc_number: str, access_token: str):
+
+def get_marcxml_from_oclc(oclc_number: str, access_token: str, dates=None):
     """
     Fetch a WorldCat Discovery v2 record and return MARCXML + the source record.
     Prefers full bibRecords; falls back to briefRecords; raises if nothing usable.
@@ -131,11 +277,11 @@ def get_marcxml_from_oclc(oclc_number: str, access_token: str):
 
     for params in query_attempts:
         try:
-            r = requests.get(base_url, headers=headers, params=params, timeout=60)
+            r = OCLC_SESSION.get(base_url, headers=headers, params=params, timeout=60)
             if r.status_code in (401, 403):
                 raise RuntimeError(f"OCLC auth error ({r.status_code}): {r.text}")
             r.raise_for_status()
-            data = r.json()
+            data = json_loads(r.content)
         except Exception as e:
             last_error_text = str(e)
             continue
@@ -146,7 +292,7 @@ def get_marcxml_from_oclc(oclc_number: str, access_token: str):
             if bibs:
                 rec = bibs[0]
                 try:
-                    marcxml = build_marcxml_from_discovery_record(rec)
+                    marcxml = build_marcxml_from_discovery_record(rec, dates)
                     return marcxml, rec
                 except Exception:
                     # Try brief below if mapping fails
@@ -156,7 +302,7 @@ def get_marcxml_from_oclc(oclc_number: str, access_token: str):
             briefs = (data.get("briefRecords") or [])
             if briefs:
                 brief = briefs[0]
-                marcxml = build_minimal_marcxml_fallback(brief)
+                marcxml = build_minimal_marcxml_fallback(brief, dates)
                 return marcxml, brief
 
         last_error_text = "No bibRecords or briefRecords in response."
@@ -166,10 +312,11 @@ def get_marcxml_from_oclc(oclc_number: str, access_token: str):
         f"Last error/response: {last_error_text or 'none'}"
     )
 
-def build_minimal_marcxml_fallback(brief_record):
+def build_minimal_marcxml_fallback(brief_record, dates=None):
     """
     Fallback: Convert a brief OCLC record to minimal but VALID MARCXML for Alma
     """
+    dates = dates or get_batch_dates()
     marc_ns = "http://www.loc.gov/MARC21/slim"
     root = ET.Element('{%s}record' % marc_ns)
     root.set('xmlns', marc_ns)
@@ -180,66 +327,48 @@ def build_minimal_marcxml_fallback(brief_record):
     
     # 001 - OCLC number
     if 'identifier' in brief_record and 'oclcNumber' in brief_record['identifier']:
-        field001 = ET.SubElement(root, 'controlfield')
-        field001.set('tag', '001')
+        field001 = ET.SubElement(root, 'controlfield', tag='001')
         field001.text = brief_record['identifier']['oclcNumber']
     
     # 003 - Control number identifier (REQUIRED)
-    field003 = ET.SubElement(root, 'controlfield')
-    field003.set('tag', '003')
+    field003 = ET.SubElement(root, 'controlfield', tag='003')
     field003.text = 'OCoLC'
     
     # 005 - Date and time of latest transaction (REQUIRED)
-    field005 = ET.SubElement(root, 'controlfield')
-    field005.set('tag', '005')
-    field005.text = datetime.now().strftime('%Y%m%d%H%M%S.0')
+    field005 = ET.SubElement(root, 'controlfield', tag='005')
+    field005.text = dates['timestamp_005']
     
     # 007 - Physical description for CD (REQUIRED for sound recordings)
-    field007 = ET.SubElement(root, 'controlfield')
-    field007.set('tag', '007')
+    field007 = ET.SubElement(root, 'controlfield', tag='007')
     field007.text = 'sd fsngnnmmned'
     
     # 008 - Fixed-length data elements (REQUIRED)
-    field008 = ET.SubElement(root, 'controlfield')
-    field008.set('tag', '008')
+    field008 = ET.SubElement(root, 'controlfield', tag='008')
     # Get publication date if available
     pub_date = '    '
     if 'date' in brief_record and 'publicationDate' in brief_record['date']:
         raw_date = brief_record['date']['publicationDate']
         year_match = re.search(r'\d{4}', raw_date)
         pub_date = year_match.group(0) if year_match else '    '
-    current_date = datetime.now().strftime('%y%m%d')
+    current_date = dates['today_6']
     field008.text = f"{current_date}s{pub_date}    xxu           |  eng d"
     
     # 035 - System Control Number (RECOMMENDED)
     if 'identifier' in brief_record and 'oclcNumber' in brief_record['identifier']:
-        field035 = ET.SubElement(root, 'datafield')
-        field035.set('tag', '035')
-        field035.set('ind1', ' ')
-        field035.set('ind2', ' ')
-        subfield_a = ET.SubElement(field035, 'subfield')
-        subfield_a.set('code', 'a')
+        field035 = ET.SubElement(root, 'datafield', tag='035', ind1=' ', ind2=' ')
+        subfield_a = ET.SubElement(field035, 'subfield', code='a')
         subfield_a.text = f"(OCoLC){brief_record['identifier']['oclcNumber']}"
     
     # 040 - Cataloging source (REQUIRED)
-    field040 = ET.SubElement(root, 'datafield')
-    field040.set('tag', '040')
-    field040.set('ind1', ' ')
-    field040.set('ind2', ' ')
-    subfield_a = ET.SubElement(field040, 'subfield')
-    subfield_a.set('code', 'a')
+    field040 = ET.SubElement(root, 'datafield', tag='040', ind1=' ', ind2=' ')
+    subfield_a = ET.SubElement(field040, 'subfield', code='a')
     subfield_a.text = 'OCLC'
-    subfield_c = ET.SubElement(field040, 'subfield')
-    subfield_c.set('code', 'c')
+    subfield_c = ET.SubElement(field040, 'subfield', code='c')
     subfield_c.text = CATALOGING_INSTITUTION 
     
     # 245 - Title (REQUIRED)
-    field245 = ET.SubElement(root, 'datafield')
-    field245.set('tag', '245')
-    field245.set('ind1', '0')
-    field245.set('ind2', '0')
-    subfield_a = ET.SubElement(field245, 'subfield')
-    subfield_a.set('code', 'a')
+    field245 = ET.SubElement(root, 'datafield', tag='245', ind1='0', ind2='0')
+    subfield_a = ET.SubElement(field245, 'subfield', code='a')
     
     if isinstance(brief_record.get('title'), str):
         subfield_a.text = brief_record['title']
@@ -252,49 +381,56 @@ def build_minimal_marcxml_fallback(brief_record):
         subfield_a.text = 'Unknown Title.'
     
     # 300 - Physical description (RECOMMENDED for CDs)
-    field300 = ET.SubElement(root, 'datafield')
-    field300.set('tag', '300')
-    field300.set('ind1', ' ')
-    field300.set('ind2', ' ')
-    subfield_a = ET.SubElement(field300, 'subfield')
-    subfield_a.set('code', 'a')
+    field300 = ET.SubElement(root, 'datafield', tag='300', ind1=' ', ind2=' ')
+    subfield_a = ET.SubElement(field300, 'subfield', code='a')
     subfield_a.text = '1 audio disc :'
-    subfield_b = ET.SubElement(field300, 'subfield')
-    subfield_b.set('code', 'b')
+    subfield_b = ET.SubElement(field300, 'subfield', code='b')
     subfield_b.text = 'digital ;'
-    subfield_c = ET.SubElement(field300, 'subfield')
-    subfield_c.set('code', 'c')
+    subfield_c = ET.SubElement(field300, 'subfield', code='c')
     subfield_c.text = '4 3/4 in.'
     
     xml_string = ET.tostring(root, encoding='unicode')
     return xml_string
 
-def build_marcxml_from_discovery_record(rec: dict) -> str:
+# Record wrapper exactly as ET.tostring() serialized the namespaced root element
+MARC_RECORD_OPEN = ('<ns0:record xmlns:ns0="http://www.loc.gov/MARC21/slim" '
+                    'xmlns="http://www.loc.gov/MARC21/slim">')
+MARC_RECORD_CLOSE = '</ns0:record>'
+
+def build_marcxml_from_discovery_record(rec: dict, dates=None) -> str:
     """
     Build reasonably rich MARCXML from a WorldCat Discovery v2 bibRecord.
     Maps obvious, high-signal fields only (conservative, not full cataloging).
     """
-    ns = "http://www.loc.gov/MARC21/slim"
-    R = ET.Element(f"{{{ns}}}record"); R.set("xmlns", ns)
+    dates = dates or get_batch_dates()
+
+    # The record is emitted as strings rather than an ElementTree; the output is the
+    # same markup ET.tostring() produced. R holds controlfield strings and, for each
+    # datafield, a list of [opening tag, subfield strings...] closed when joined.
+    R = []
 
     def cf(tag, text):
         if text:
-            el = ET.SubElement(R, "controlfield"); el.set("tag", tag); el.text = text
+            R.append(f'<controlfield tag="{tag}">{xml_escape(text)}</controlfield>')
 
     def df(tag, ind1=" ", ind2=" "):
-        el = ET.SubElement(R, "datafield"); el.set("tag", tag); el.set("ind1", ind1); el.set("ind2", ind2); return el
+        el = [f'<datafield tag="{tag}" ind1="{ind1}" ind2="{ind2}"']
+        R.append(el)
+        return el
 
     def sf(df_el, code, text):
-        if text is not None and str(text).strip() != "":
-            s = ET.SubElement(df_el, "subfield"); s.set("code", code); s.text = str(text)
+        if text is not None:
+            text = str(text)
+            if text.strip() != "":
+                df_el.append(f'<subfield code="{code}">{xml_escape(text)}</subfield>')
 
     # --- Leader / controlfields ---
-    leader = ET.SubElement(R, "leader"); leader.text = "00000njm a2200000 i 4500"
+    R.append("<leader>00000njm a2200000 i 4500</leader>")
 
     oclc_num = (rec.get("identifier") or {}).get("oclcNumber")
     cf("001", oclc_num or "")
     cf("003", "OCoLC")
-    cf("005", datetime.now().strftime("%Y%m%d%H%M%S.0"))
+    cf("005", dates["timestamp_005"])
 
     # 007: format-sensitive
     specific_fmt = (rec.get("format") or {}).get("specificFormat", "")
@@ -309,7 +445,7 @@ def build_marcxml_from_discovery_record(rec: dict) -> str:
     pub_year4 = year_match.group(0) if year_match else "    "  # 4 digits only for 008
     prefix = pub_year[:year_match.start()] if year_match else ""
     pub_year_264 = prefix + year_match.group(0) if year_match else ""  # full value for 264
-    today_6 = datetime.now().strftime("%y%m%d")
+    today_6 = dates["today_6"]
     lang = (rec.get("language") or {}).get("itemLanguage", "eng")
     cf("008", f"{today_6}s{pub_year4}    xxu                 {lang} d")
 
@@ -385,18 +521,27 @@ def build_marcxml_from_discovery_record(rec: dict) -> str:
                 code = s.get("code"); content = s.get("content")
                 if code in ("a", "b", "q"): sf(f028, code, content)
 
-    other_ids = ((rec.get("identifier") or {}).get("otherStandardIdentifiers")) or []
-    for oid in other_ids:
-        id_type = (oid.get("type") or "").lower()
+    # One pass over the identifiers, sorted into 028s and 024s (all 028s are emitted first)
+    publisher_numbers = []
+    upcs = []
+    for oid in (((rec.get("identifier") or {}).get("otherStandardIdentifiers")) or []):
+        if not isinstance(oid, dict):
+            continue
         id_val = oid.get("id")
-        if id_val and any(t in id_type for t in ["music", "publisher", "catalog"]):
-            f028 = df("028", "0", " "); sf(f028, "a", id_val); sf(f028, "b", id_type)
+        if not id_val:
+            continue
+        id_type = (oid.get("type") or "").lower()
+        if "music" in id_type or "publisher" in id_type or "catalog" in id_type:
+            publisher_numbers.append((id_val, id_type))
+        if "upc" in id_type:
+            upcs.append(id_val)
+
+    for id_val, id_type in publisher_numbers:
+        f028 = df("028", "0", " "); sf(f028, "a", id_val); sf(f028, "b", id_type)
 
     # 024 UPC
-    for oid in other_ids:
-        id_type = (oid.get("type") or "").upper()
-        if "UPC" in id_type and oid.get("id"):
-            f024 = df("024", "1", " "); sf(f024, "a", oid["id"])
+    for id_val in upcs:
+        f024 = df("024", "1", " "); sf(f024, "a", id_val)
 
     # 050/082 (light-touch)
     cls = rec.get("classification") or {}
@@ -440,7 +585,27 @@ def build_marcxml_from_discovery_record(rec: dict) -> str:
     f337 = df("337"); sf(f337, "a", "audio");          sf(f337, "b", "s");   sf(f337, "2", "rdamedia")
     f338 = df("338"); sf(f338, "a", "audio disc");     sf(f338, "b", "sd");  sf(f338, "2", "rdacarrier")
 
-    return ET.tostring(R, encoding="unicode")
+    parts = [MARC_RECORD_OPEN]
+    for el in R:
+        if isinstance(el, str):
+            parts.append(el)
+        elif len(el) == 1:
+            parts.append(el[0] + " />")  # datafield with no subfields
+        else:
+            parts.append(el[0] + ">")
+            parts.extend(el[1:])
+            parts.append("</datafield>")
+    parts.append(MARC_RECORD_CLOSE)
+    return "".join(parts)
+
+
+@lru_cache(maxsize=16)
+def _format_and_material_for(spec: str):
+    """(specific_format, alma_item_material_value) for an upper-cased specificFormat."""
+    if spec == "LP":
+        # Verify your Alma codes; 'VINYL' is a placeholder if that's your configured code.
+        return ("LP", "VINYL")
+    return (spec or "CD", "CD")
 
 
 def detect_format_and_material_type(bib_record: dict):
@@ -448,10 +613,7 @@ def detect_format_and_material_type(bib_record: dict):
     Returns (specific_format, alma_item_material_value)
     """
     spec = ((bib_record.get("format") or {}).get("specificFormat") or "").upper()
-    if spec == "LP":
-        # Verify your Alma codes; 'VINYL' is a placeholder if that's your configured code.
-        return ("LP", "VINYL")
-    return (spec or "CD", "CD")
+    return _format_and_material_for(spec)
 
 
 def _extract_oclc_from_network_number(network_number):
@@ -504,6 +666,87 @@ def _verify_oclc_in_bib(bib_element, target_oclc):
     return False
 
 
+# OCLC -> MMS ID map pulled from an Alma Analytics report (see --prefetch-existing).
+# Numbers found here skip the live Alma lookup entirely; misses still go to the API.
+OCLC_MAP_PATH = os.path.join(os.path.expanduser("~"), ".cache", "alma_oclc_map.json")
+OCLC_MAP_REPORT = os.environ.get("ALMA_OCLC_MAP_REPORT")
+# A map hit is never re-checked live, so a bib deleted since the fetch would be reported
+# as already in Alma; only a recent map is trusted
+OCLC_MAP_MAX_AGE_SECONDS = float(os.environ.get("ALMA_OCLC_MAP_MAX_AGE_HOURS", "24")) * 3600
+ANALYTICS_PAGE_SIZE = 1000
+_ROWSET_NS = "{urn:schemas-microsoft-com:xml-analysis:rowset}"
+
+def prefetch_oclc_map(report_path, map_path=OCLC_MAP_PATH):
+    """
+    Page through an Alma Analytics report and save its OCLC -> MMS ID pairs to map_path.
+
+    The report's first two columns (Column1, Column2 after Analytics' constant
+    Column0) must be MMS Id and Network Number; several network numbers in one
+    cell may be separated by semicolons. Returns the number of OCLC numbers mapped.
+    """
+    url = f"{ALMA_BASE}/analytics/reports"
+    params = {"path": report_path, "limit": ANALYTICS_PAGE_SIZE, "col_names": "false"}
+    oclc_map = {}
+
+    while True:
+        r = ALMA_SESSION.get(url, params=params, timeout=300)
+        r.raise_for_status()
+        root = ET.fromstring(r.content)
+
+        for row in root.iter(f"{_ROWSET_NS}Row"):
+            mms_id = row.findtext(f"{_ROWSET_NS}Column1")
+            network_numbers = row.findtext(f"{_ROWSET_NS}Column2")
+            if not mms_id or not network_numbers:
+                continue
+            for nn in network_numbers.split(';'):
+                extracted_oclc = _extract_oclc_from_network_number(nn)
+                if extracted_oclc:
+                    oclc_map.setdefault(extracted_oclc.lstrip('0'), mms_id.strip())
+
+        # The resumption token is only sent on the first page; later pages reuse it
+        token = root.findtext('QueryResult/ResumptionToken') or params.get("token")
+        if root.findtext('QueryResult/IsFinished') != 'false' or not token:
+            break
+        params = {"token": token, "limit": ANALYTICS_PAGE_SIZE}
+
+    cache_dir = os.path.dirname(map_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"report": report_path, "fetched_at": time.time(), "oclc_map": oclc_map}, f)
+        os.replace(tmp_path, map_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return len(oclc_map)
+
+def load_oclc_map(map_path=OCLC_MAP_PATH, report_path=OCLC_MAP_REPORT, max_age_seconds=OCLC_MAP_MAX_AGE_SECONDS):
+    """
+    Return (oclc_map, fetched_at) from the prefetched map file, or ({}, None) if there is
+    none or it cannot be trusted: built from a report other than report_path, or fetched
+    more than max_age_seconds ago.
+    """
+    try:
+        with open(map_path, 'rb') as f:
+            data = json_loads(f.read())
+    except (OSError, ValueError):
+        return {}, None
+
+    fetched_at = data.get("fetched_at")
+    if not report_path or data.get("report") != report_path:
+        print(f"\nIgnoring prefetched OCLC map: it was built from {data.get('report')!r}, "
+              f"not ALMA_OCLC_MAP_REPORT ({report_path!r})")
+        return {}, None
+    if not fetched_at or time.time() - fetched_at > max_age_seconds:
+        print(f"\nIgnoring prefetched OCLC map: older than {max_age_seconds / 3600:g} hours "
+              f"(refresh it with --prefetch-existing)")
+        return {}, None
+    return data.get("oclc_map", {}), fetched_at
+
+
 def check_if_oclc_exists_in_alma(oclc_number):
     """
     Search Alma to see if an OCLC number already exists.
@@ -514,37 +757,25 @@ def check_if_oclc_exists_in_alma(oclc_number):
     """
     url = f"{ALMA_BASE}/bibs"
 
-    oclc_num = oclc_number.replace("(OCoLC)", "").strip()
-    for prefix in ['ocm', 'ocn', 'on']:
-        if oclc_num.startswith(prefix):
-            oclc_num = oclc_num[len(prefix):]
-            break
-
-    # Try multiple OCLC prefix formats (ocm=older, ocn=post-2001, on=newest)
-    search_formats = [
-        f"(OCoLC){oclc_num}",
-        f"ocm{oclc_num}",
-        f"ocn{oclc_num}",
-        f"on{oclc_num}",
-        oclc_num
-    ]
+    oclc_num = normalize_oclc_number(oclc_number)
 
-    for search_term in search_formats:
+    for search_term in oclc_search_formats(oclc_num):
         params = {
             "other_system_id": search_term,
             "limit": "1"
         }
 
         try:
-            r = requests.get(url, headers=HEADERS_XML, params=params, timeout=60)
+            r = ALMA_SESSION.get(url, params=params, timeout=60)
             r.raise_for_status()
 
-            root = ET.fromstring(r.text)
+            root = ET.fromstring(r.content)
             # total_record_count is an attribute on <bibs>, not a child element
             total_records = root.get('total_record_count')
 
             if total_records is not None and int(total_records) > 0:
-                bib = root.find('.//bib')
+                # iter() walks the tree directly instead of going through ElementPath
+                bib = next(root.iter('bib'), None)
                 if bib is not None:
                     # Verify this record actually contains our OCLC number
                     # (not just a partial match on a non-OCLC identifier)
@@ -561,8 +792,8 @@ def check_if_oclc_exists_in_alma(oclc_number):
     return None
 
 
-def import_to_alma(marcxml, normalization_rule=None):
-    """Import MARCXML into Alma and return MMS ID."""
+def import_to_alma_with_bib(marcxml, normalization_rule=None):
+    """Import MARCXML into Alma and return (MMS ID, the created <bib> element Alma echoes back)."""
     url_bibs = f"{ALMA_BASE}/bibs"
     
     params = {}
@@ -572,115 +803,121 @@ def import_to_alma(marcxml, normalization_rule=None):
     # Wrap the MARC record in <bib> tags
     bib_xml = f"<bib>{marcxml}</bib>"
     
-    r = requests.post(url_bibs, headers=HEADERS_XML, params=params, data=bib_xml, timeout=120)
+    r = ALMA_SESSION.post(url_bibs, params=params, data=bib_xml, timeout=120)
     r.raise_for_status()
     
-    result = ET.fromstring(r.text)
+    result = ET.fromstring(r.content)
     mms_id = result.find('mms_id')
     
     if mms_id is not None:
-        return mms_id.text
+        return mms_id.text, result
     else:
         raise RuntimeError("No MMS ID returned from Alma")
 
+def import_to_alma(marcxml, normalization_rule=None):
+    """Import MARCXML into Alma and return MMS ID."""
+    return import_to_alma_with_bib(marcxml, normalization_rule)[0]
+
 # This unsuppresses new bibs when called (makes them visible in Primo VE). Leave it in for immediate discovery.
-def unsuppress_bib(mms_id: str):
-    """Unsuppress bib for Discovery (Primo VE). Does NOT touch external search."""
+def unsuppress_bib(mms_id: str, bib_xml=None):
+    """
+    Unsuppress bib for Discovery (Primo VE). Does NOT touch external search.
+
+    bib_xml may be the <bib> Alma returned from the import POST, which saves
+    re-fetching it; without it the bib is fetched first.
+    """
     url = f"{ALMA_BASE}/bibs/{mms_id}"
 
-    # GET existing bib
-    r = requests.get(url, headers=HEADERS_XML, timeout=60)
-    r.raise_for_status()
-    bib_xml = ET.fromstring(r.text)
+    if bib_xml is None:
+        # GET existing bib
+        r = ALMA_SESSION.get(url, timeout=60)
+        r.raise_for_status()
+        bib_xml = ET.fromstring(r.content)
 
     # Ensure <suppress_from_publishing> exists, then set to false
     s = bib_xml.find('suppress_from_publishing')
+    if s is not None and s.text == 'false':
+        return  # Already visible; nothing to update
     if s is None:
         s = ET.SubElement(bib_xml, 'suppress_from_publishing')
     s.text = 'false'
 
     # PUT back (update in Alma)
-    r2 = requests.put(
+    r2 = ALMA_SESSION.put(
         url,
-        headers=HEADERS_XML,
         data=ET.tostring(bib_xml, encoding='unicode'),
         timeout=60
     )
     r2.raise_for_status()
 
-def get_holdings(mms_id, location_code):
-    """Check if holding exists for the specified location."""
-    url_holdings = f"{ALMA_BASE}/bibs/{mms_id}/holdings"
-    
-    r = requests.get(url_holdings, headers=HEADERS_XML, timeout=60)
-    r.raise_for_status()
-    
-    root = ET.fromstring(r.text)
-    
-    for holding in root.findall('holding'):
-        loc = holding.find('location')
-        if loc is not None and loc.text == location_code:
-            hid = holding.find('holding_id')
-            if hid is not None:
-                return hid.text
-    
-    return None
-
-def create_holding(mms_id, library_code, location_code):
-    """Create a minimal, neutral holding record."""
-    url_holdings = f"{ALMA_BASE}/bibs/{mms_id}/holdings"
-    today6 = datetime.now().strftime('%y%m%d')
-
-    # Minimal leader + neutral 008 (date-stamped) + 852(b,c)
-    data = f'''<holding>
+# Fixed-shape POST bodies, filled with %-formatting straight into bytes.
+# Minimal leader + neutral 008 (date-stamped) + 852(b,c)
+_HOLDING_TEMPLATE = b'''<holding>
   <record>
     <leader>00000nx a2200000   4500</leader>
-    <controlfield tag="008">{today6}{" " * 32}</controlfield>
+    <controlfield tag="008">%b''' + b" " * 32 + b'''</controlfield>
     <datafield ind1=" " ind2=" " tag="852">
-      <subfield code="b">{library_code}</subfield>
-      <subfield code="c">{location_code}</subfield>
+      <subfield code="b">%b</subfield>
+      <subfield code="c">%b</subfield>
     </datafield>
   </record>
 </holding>'''
 
-    r = requests.post(url_holdings, headers=HEADERS_XML, data=data, timeout=60)
+# The internal note never changes during a run, so it is baked in once
+_ITEM_TEMPLATE = b'''<item>
+  <holding_data>
+    <holding_id>%b</holding_id>
+    <in_temp_location>false</in_temp_location>
+  </holding_data>
+  <item_data>
+    <barcode>%b</barcode>
+    <physical_material_type>%b</physical_material_type>
+    <policy><value>%b</value></policy>
+    <arrival_date>%b</arrival_date>
+    <internal_note_2>''' + xml_escape(INTERNAL_NOTE_2).encode('utf-8') + b'''</internal_note_2>
+    <process_type>PHYSICAL_PROCESSING</process_type>
+  </item_data>
+</item>'''
+
+def _xml_bytes(value):
+    """XML-escape a value and encode it for a payload template."""
+    return xml_escape(str(value)).encode('utf-8')
+
+def create_holding(mms_id, library_code, location_code, dates=None):
+    """Create a minimal, neutral holding record."""
+    url_holdings = f"{ALMA_BASE}/bibs/{mms_id}/holdings"
+    today6 = (dates or get_batch_dates())['today_6']
+
+    # Values are XML-escaped
+    data = _HOLDING_TEMPLATE % (today6.encode('ascii'), _xml_bytes(library_code), _xml_bytes(location_code))
+
+    r = ALMA_SESSION.post(url_holdings, data=data, timeout=60)
     r.raise_for_status()
-    root = ET.fromstring(r.text)
+    root = ET.fromstring(r.content)
     hid = root.findtext('holding_id')
     if not hid:
         raise RuntimeError("Failed to create holding")
     return hid
 
-def create_item(mms_id, holding_id, barcode, item_policy_code, material_value="CD"):
+def create_item(mms_id, holding_id, barcode, item_policy_code, material_value="CD", dates=None):
     """Create a physical item with a minimal payload. Material type is hard-coded to CD for this workflow."""
     url_items = f"{ALMA_BASE}/bibs/{mms_id}/holdings/{holding_id}/items"
-    today = datetime.now().strftime("%Y-%m-%d") + "Z"
+    today = (dates or get_batch_dates())['arrival_date']
 
     # Force CD for this workflow; ignore any callers' variation
     material_value = "CD"
 
-    data = f'''<item>
-  <holding_data>
-    <holding_id>{holding_id}</holding_id>
-    <in_temp_location>false</in_temp_location>
-  </holding_data>
-  <item_data>
-    <barcode>{barcode}</barcode>
-    <physical_material_type>{material_value}</physical_material_type>
-    <policy><value>{item_policy_code}</value></policy>
-    <arrival_date>{today}</arrival_date>
-    <internal_note_2>{INTERNAL_NOTE_2}</internal_note_2>
-    <process_type>PHYSICAL_PROCESSING</process_type>
-  </item_data>
-</item>'''
+    # Values are XML-escaped; a stray & or < in a barcode or note would otherwise break the payload
+    data = _ITEM_TEMPLATE % (_xml_bytes(holding_id), _xml_bytes(barcode), _xml_bytes(material_value),
+                             _xml_bytes(item_policy_code), today.encode('ascii'))
 
-    r = requests.post(url_items, headers=HEADERS_XML, data=data, timeout=60)
+    # Body stays XML; only the response is requested as JSON, which decodes faster
+    r = ALMA_SESSION.post(url_items, data=data, headers={"Accept": "application/json"}, timeout=60)
     r.raise_for_status()
 
-    root = ET.fromstring(r.text)
-    item_pid = root.find('.//pid')
-    if item_pid is not None:
-        return item_pid.text
+    item_pid = (json_loads(r.content).get('item_data') or {}).get('pid')
+    if item_pid:
+        return item_pid
     else:
         raise RuntimeError("Item creation failed - no PID returned")
 
@@ -691,10 +928,16 @@ def ensure_under_dir(file_path: str, allowed_root: str):
         raise SystemExit(f"Error: {p} is outside allowed path: {root}")
 
 def report_summary(input_file, delimiter):
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = [ln.strip() for ln in f if ln.strip()]
-    total = len(lines)
-    sample = lines[:5]
+    # Stream the file: count non-blank lines and keep only the first 5 for the snippet
+    total = 0
+    sample = []
+    with open(input_file, 'r', encoding='utf-8', buffering=1 << 20) as f:
+        for ln in f:
+            ln = ln.strip()
+            if ln:
+                total += 1
+                if len(sample) < 5:
+                    sample.append(ln)
     print("\n--- CONSOLE REPORT ---")
     print ()
     print(f"Input file: {input_file}")
@@ -730,9 +973,9 @@ def _classify_oclc_source(rec: dict) -> str:
 '''
 def print_physical_material_type_codes():
     url = f"{ALMA_BASE}/conf/code-tables/PhysicalMaterialType"
-    r = requests.get(url, headers=HEADERS_XML, timeout=60)
+    r = ALMA_SESSION.get(url, timeout=60)
     r.raise_for_status()
-    root = ET.fromstring(r.text)
+    root = ET.fromstring(r.content)
     print("PhysicalMaterialType codes:")
     for row in root.findall('.//row'):
         val = row.findtext('code')
@@ -742,87 +985,116 @@ def print_physical_material_type_codes():
 
 # ====== MAIN PROCESSING ======
 
-def process_file(input_file, delimiter='|'):
-    """Process input file with format: oclcNumber|barcode or oclcNumber|barcode|title"""
-    if not all([alma_api_key, client_id, client_secret]):
-        raise SystemExit("Error: Missing required environment variables")
-    
-    print("="*60)
-    print("OCLC to Alma Import Script - CD Workflow")
-    print("="*60)
-    print(f"Library: {LIBRARY_CODE}")
-    print(f"Location: {LOCATION_CODE}")
-    print(f"Item Policy: {ITEM_POLICY_CODE}")
-    print(f"Input File: {input_file}")
-    print("="*60)
-    
-    print("\nAuthenticating with OCLC...")
-    try:
-        oclc_token = get_access_token(client_id, client_secret)
-        token_time = time.time()
-        print("OCLC authentication successful")
-    except Exception as e:
-        raise SystemExit(f"Failed to authenticate with OCLC: {e}")
-    
-    results = []
-    
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = [line.strip() for line in f if line.strip()]
-    
-    total = len(lines)
-    print(f"\nProcessing {total} records...\n")
-    
-    for idx, line in enumerate(lines, 1):
-        # Refresh OCLC token every 15 minutes to avoid 401 errors
-        if time.time() - token_time > 900:
-            print("         Refreshing OCLC token...")
-            try:
-                oclc_token = get_access_token(client_id, client_secret)
-                token_time = time.time()
-                print("         OCLC token refreshed successfully")
-            except Exception as e:
-                print(f"         WARNING: Token refresh failed: {e}")
+class OCLCTokenManager:
+    """Share one OCLC access token across worker threads, refreshing it when it expires."""
+
+    def __init__(self, client_id, client_secret):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self._lock = threading.Lock()
+        self._token, self._expires_at = get_access_token_with_expiry(client_id, client_secret)
+
+    def get_token(self, log):
+        """Return a valid token, refreshing it first if it has expired."""
+        with self._lock:
+            # Refresh before the token lapses to avoid 401 errors
+            if time.time() >= self._expires_at:
+                log.append("         Refreshing OCLC token...")
+                try:
+                    self._token, self._expires_at = get_access_token_with_expiry(self.client_id, self.client_secret)
+                    log.append("         OCLC token refreshed successfully")
+                except Exception as e:
+                    log.append(f"         WARNING: Token refresh failed: {e}")
+            return self._token
+
+
+class ImportRun:
+    """State shared by every record (and worker thread) in one process_file run."""
+
+    def __init__(self, total, delimiter, token_manager, alma_matches, alma_checked, side_executor):
+        self.total = total
+        self.delimiter = delimiter
+        self.token_manager = token_manager
+        # Batched pre-check results; records imported during this run are added too
+        self.alma_matches = alma_matches
+        self.alma_checked = alma_checked
+        self.dates = get_batch_dates()
+        # Separate pool for a record's independent sub-requests (record workers block on these)
+        self.side_executor = side_executor
+        self._oclc_locks = {}
+        self._oclc_locks_guard = threading.Lock()
+
+    def oclc_lock(self, oclc_num):
+        """Return the lock that serializes records sharing an OCLC number."""
+        with self._oclc_locks_guard:
+            lock = self._oclc_locks.get(oclc_num)
+            if lock is None:
+                lock = self._oclc_locks[oclc_num] = threading.Lock()
+            return lock
+
+    def find_existing_mms_id(self, oclc_num):
+        """Return the MMS ID for an OCLC number already in Alma, or None."""
+        if oclc_num in self.alma_matches:
+            return self.alma_matches[oclc_num]
+        if oclc_num in self.alma_checked:
+            return None
+        return check_if_oclc_exists_in_alma(oclc_num)
+
+
+def process_record(idx, row, run):
+    """
+    Run the full OCLC -> Alma pipeline for one input row (fields already split).
 
-        if delimiter not in line:
-            print(f"[{idx}/{total}] Skipping invalid line: {line}")
-            continue
-        
-        parts = line.split(delimiter, 2)
-        if len(parts) < 2:
-            print(f"[{idx}/{total}] Skipping - need at least oclcNumber{delimiter}barcode: {line}")
-            continue
-        
-        oclc_num = parts[0].strip()
-        barcode = parts[1].strip()
-        title = parts[2].strip() if len(parts) > 2 else ""  # Title is optional
-        
-        print(f"[{idx}/{total}] Processing OCLC #{oclc_num} | Barcode: {barcode}")
-        if title:
-            print(f"         Title: {title[:60]}...")
-        
-        result = {
-            'oclc': oclc_num,
-            'barcode': barcode,
-            'title': title
-        }
-        
+    Console output is collected in a list and returned with the result so that
+    records processed concurrently do not interleave their log lines.
+
+    Returns: (result dict or None if the line was skipped, list of log lines)
+    """
+    log = []
+    total = run.total
+    delimiter = run.delimiter
+
+    if len(row) < 2:
+        log.append(f"[{idx}/{total}] Skipping invalid line: {delimiter.join(row).strip()}")
+        return None, log
+
+    oclc_num = row[0].strip()
+    barcode = row[1].strip()
+    # Title is optional; any further delimiters belong to the title
+    title = delimiter.join(row[2:]).strip() if len(row) > 2 else ""
+
+    log.append(f"[{idx}/{total}] Processing OCLC #{oclc_num} | Barcode: {barcode}")
+    if title:
+        log.append(f"         Title: {title[:60]}...")
+
+    result = {
+        'oclc': oclc_num,
+        'barcode': barcode,
+        'title': title
+    }
+
+    oclc_token = run.token_manager.get_token(log)
+
+    # Records with the same OCLC number run one at a time so the second one
+    # sees the bib the first one imported instead of creating a duplicate.
+    with run.oclc_lock(oclc_num):
         max_retries = 3
         for attempt in range(max_retries):
             try:
                 # Step 1: Check if record already exists
-                print(f"         Checking if OCLC #{oclc_num} exists in Alma...")
-                existing_mms_id = check_if_oclc_exists_in_alma(oclc_num)
+                log.append(f"         Checking if OCLC #{oclc_num} exists in Alma...")
+                existing_mms_id = run.find_existing_mms_id(oclc_num)
 
                 if existing_mms_id:
-                    print(f"         ALREADY EXISTS in Alma (MMS ID: {existing_mms_id})")
-                    print(f"         Item will NOT be processed")
-                    print(f"         Check physical item or add to giveaway pile\n")
+                    log.append(f"         ALREADY EXISTS in Alma (MMS ID: {existing_mms_id})")
+                    log.append(f"         Item will NOT be processed")
+                    log.append(f"         Check physical item or add to giveaway pile\n")
                     result['mms_id'] = existing_mms_id
                     result['status'] = 'already_exists'
                     result['action'] = 'Verify physical item or discard'
                 else:
-                    print(f"         Record not found, fetching from OCLC...")
-                    marcxml, discovery_rec = get_marcxml_from_oclc(oclc_num, oclc_token)
+                    log.append(f"         Record not found, fetching from OCLC...")
+                    marcxml, discovery_rec = get_marcxml_from_oclc(oclc_num, oclc_token, run.dates)
                     result['oclc_source'] = _classify_oclc_source(discovery_rec)
 
                     # Hard-code CD for this workflow
@@ -831,129 +1103,288 @@ def process_file(input_file, delimiter='|'):
                     mat_value = "CD"
 
 
-                    print(f"         Importing to Alma...")
-                    mms_id = import_to_alma(marcxml)
+                    log.append(f"         Importing to Alma...")
+                    mms_id, created_bib = import_to_alma_with_bib(marcxml)
                     result['mms_id'] = mms_id
-                    print(f"         MMS ID created: {mms_id}")
-
-                    # NEW: immediately unsuppress so it's not hidden in Primo VE
-                    print(f"         Unsuppressing bib in Alma...")
-                    unsuppress_bib(mms_id)
-                    print(f"         Bib is visible (Suppress from Discovery = OFF)")
-
-                    # Step 3: Check/create holding
-                    print(f"         Checking holdings...")
-                    holding_id = get_holdings(mms_id, LOCATION_CODE)
-
-                    if holding_id:
-                        print(f"         Found existing holding: {holding_id}")
-                    else:
-                        print(f"         Creating holding...")
-                        holding_id = create_holding(mms_id, LIBRARY_CODE, LOCATION_CODE)
-                        print(f"         Created holding: {holding_id}")
-
-                    result['holding_id'] = holding_id
-
-                    # Step 4: Create item
-                    print(f"         Creating item (material: {mat_value})...")
-                    item_pid = create_item(mms_id, holding_id, barcode, ITEM_POLICY_CODE, material_value=mat_value)
-                    result['item_pid'] = item_pid
-                    print(f"         Item created: {barcode}")
+                    run.alma_matches[oclc_num] = mms_id
+                    log.append(f"         MMS ID created: {mms_id}")
+
+                    # NEW: immediately unsuppress so it's not hidden in Primo VE.
+                    # Only needs the bib the import returned, so the PUT runs alongside the
+                    # holding/item POSTs without a GET of its own.
+                    log.append(f"         Unsuppressing bib in Alma (in parallel)...")
+                    unsuppress_future = run.side_executor.submit(unsuppress_bib, mms_id, created_bib)
+
+                    try:
+                        # Step 3: Create holding (a bib we just created cannot have holdings
+                        # yet, so skip the GET /holdings lookup and save a round-trip)
+                        log.append(f"         Creating holding...")
+                        holding_id = create_holding(mms_id, LIBRARY_CODE, LOCATION_CODE, run.dates)
+                        log.append(f"         Created holding: {holding_id}")
+
+                        result['holding_id'] = holding_id
+
+                        # Step 4: Create item
+                        log.append(f"         Creating item (material: {mat_value})...")
+                        item_pid = create_item(mms_id, holding_id, barcode, ITEM_POLICY_CODE, material_value=mat_value, dates=run.dates)
+                        result['item_pid'] = item_pid
+                        log.append(f"         Item created: {barcode}")
+                    finally:
+                        # Never leave the PUT running past this record, even if a POST failed
+                        wait([unsuppress_future])
+
+                    try:
+                        unsuppress_future.result()
+                        log.append(f"         Bib is visible (Suppress from Discovery = OFF)")
+                    except Exception as e:
+                        # Bib, holding and item already exist in Alma, so the record still
+                        # counts as imported and its IDs go to the ID table; only the
+                        # discovery flag needs fixing by hand.
+                        result['warning'] = f"unsuppress failed: {e}"
+                        log.append(f"         WARNING: {result['warning']}")
+                        log.append(f"         Set Suppress from Discovery = OFF manually for MMS ID {mms_id}")
 
                     result['status'] = 'success'
-                    print(f"         SUCCESS (new record imported)\n")
-                    print(f"         Source used: {result.get('oclc_source','Unknown')}\n")
+                    log.append(f"         SUCCESS (new record imported)\n")
+                    log.append(f"         Source used: {result.get('oclc_source','Unknown')}\n")
 
                 break  # Success or already_exists — no retry needed
 
             except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
                 if attempt < max_retries - 1:
                     wait_time = 30 * (2 ** attempt)
-                    print(f"         Timeout/connection error (attempt {attempt + 1}/{max_retries}): {e}")
-                    print(f"         Retrying in {wait_time}s...")
+                    log.append(f"         Timeout/connection error (attempt {attempt + 1}/{max_retries}): {e}")
+                    log.append(f"         Retrying in {wait_time}s...")
                     time.sleep(wait_time)
                 else:
                     result['status'] = 'error'
                     result['error'] = str(e)
-                    print(f"         ERROR after {max_retries} attempts: {e}\n")
+                    log.append(f"         ERROR after {max_retries} attempts: {e}\n")
 
             except requests.exceptions.HTTPError as e:
                 error_msg = f"HTTP {e.response.status_code}: {e.response.text}"
                 result['status'] = 'error'
                 result['error'] = error_msg
-                print(f"         ERROR: {error_msg}\n")
+                log.append(f"         ERROR: {error_msg}\n")
                 break
 
             except Exception as e:
                 result['status'] = 'error'
                 result['error'] = str(e)
-                print(f"         ERROR: {e}\n")
+                log.append(f"         ERROR: {e}\n")
                 break
-        
-        results.append(result)
-        time.sleep(2.0) # To avoid hitting rate limits
+
+    return result, log
+
+
+def process_file(input_file, delimiter='|'):
+    """Process input file with format: oclcNumber|barcode or oclcNumber|barcode|title"""
+    if not all([alma_api_key, client_id, client_secret]):
+        raise SystemExit("Error: Missing required environment variables")
     
-    return results
+    print("="*60)
+    print("OCLC to Alma Import Script - CD Workflow")
+    print("="*60)
+    print(f"Library: {LIBRARY_CODE}")
+    print(f"Location: {LOCATION_CODE}")
+    print(f"Item Policy: {ITEM_POLICY_CODE}")
+    print(f"Input File: {input_file}")
+    print("="*60)
+    
+    print("\nAuthenticating with OCLC...")
+    try:
+        token_manager = OCLCTokenManager(client_id, client_secret)
+        print("OCLC authentication successful")
+    except Exception as e:
+        raise SystemExit(f"Failed to authenticate with OCLC: {e}")
+    
+    # csv.reader splits every line in C; QUOTE_NONE keeps quote characters in titles literal
+    with open(input_file, 'r', newline='', encoding='utf-8', buffering=1 << 20) as f:
+        rows = [row for row in csv.reader(f, delimiter=delimiter, quoting=csv.QUOTE_NONE)
+                if delimiter.join(row).strip()]
+    
+    total = len(rows)
+
+    oclc_numbers = [row[0].strip() for row in rows if len(row) > 1]
+
+    # Numbers in a recent prefetched OCLC map are known to exist without asking Alma
+    oclc_map, fetched_at = load_oclc_map()
+    prefetched = {}
+    if oclc_map:
+        for number in oclc_numbers:
+            mms_id = oclc_map.get(normalize_oclc_number(number).lstrip('0'))
+            if mms_id:
+                prefetched[number] = mms_id
+        age_hours = (time.time() - fetched_at) / 3600
+        print(f"\nFound {len(prefetched)} in the prefetched OCLC map ({age_hours:.1f} hours old)")
+
+    # One batched existence lookup up front instead of up to 5 searches per record
+    remaining = [number for number in oclc_numbers if number not in prefetched]
+    print(f"\nChecking {len(set(remaining))} OCLC numbers against Alma...")
+    # Live answers only: a cached match would mark a since-deleted bib as already in Alma
+    checked_numbers = check_oclcs_in_alma_batch(remaining, use_cache=False)
+    alma_matches = {number: mms_id for number, mms_id in checked_numbers.items() if mms_id}
+    alma_checked = set(checked_numbers)
+    print(f"Found {len(alma_matches)} already in Alma")
+    alma_matches.update(prefetched)
+    alma_checked.update(prefetched)
+
+    print(f"\nProcessing {total} records ({MAX_CONCURRENT_RECORDS} at a time)...\n")
+
+    # Successful records go straight to the ID table; only the (usually few)
+    # already-existing and failed records are kept for the summary.
+    summary = {'processed': 0, 'success': 0, 'already_exists': [], 'errors': [], 'warnings': [], 'csv_path': None}
+    id_table = IdTableWriter(input_file, "cd")
+
+    def record_outcome(result, log):
+        # Workers buffer their lines; the main thread writes each record's block at once
+        sys.stdout.write("\n".join(log) + "\n")
+        sys.stdout.flush()
+        if result is None:
+            return
+        summary['processed'] += 1
+        if result['status'] == 'success':
+            id_table.write(result)
+            summary['success'] += 1
+            if result.get('warning'):
+                summary['warnings'].append(result)
+        elif result['status'] == 'already_exists':
+            summary['already_exists'].append(result)
+        else:
+            summary['errors'].append(result)
+
+    try:
+        # Records are I/O bound (5-7 HTTPS round-trips each), so overlap them across
+        # a small thread pool. Only a bounded window is queued ahead, and results are
+        # taken from its front, so output stays in input order.
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_RECORDS) as side_executor, \
+                ThreadPoolExecutor(max_workers=MAX_CONCURRENT_RECORDS) as executor:
+            run = ImportRun(total, delimiter, token_manager, alma_matches, alma_checked, side_executor)
+            window = deque()
+            try:
+                for idx, row in enumerate(rows, 1):
+                    window.append(executor.submit(process_record, idx, row, run))
+                    if len(window) >= 2 * MAX_CONCURRENT_RECORDS:
+                        # Look before popping so an interrupt here leaves the record in the window
+                        outcome = window[0].result()
+                        window.popleft()
+                        record_outcome(*outcome)
+                while window:
+                    outcome = window[0].result()
+                    window.popleft()
+                    record_outcome(*outcome)
+            except BaseException:
+                # Ctrl-C or a fatal error: keep queued records from starting an import, but
+                # let the ones already talking to Alma finish and record their IDs, since
+                # whatever they created exists in Alma either way.
+                executor.shutdown(wait=False, cancel_futures=True)
+                started = [future for future in window if not future.cancelled()]
+                print(f"\nInterrupted: finishing {len(started)} record(s) already in progress, "
+                      f"{len(window) - len(started)} queued record(s) not started")
+                for future in started:
+                    try:
+                        record_outcome(*future.result())
+                    except Exception as e:
+                        print(f"         ERROR in record still in progress: {e}")
+                side_executor.shutdown(wait=False, cancel_futures=True)
+                raise
+    finally:
+        # Also runs on Ctrl-C or a fatal error, after in-progress records were drained,
+        # so every record created in Alma so far is in the table
+        summary['csv_path'] = id_table.close()
+    
+    return summary
 
-def get_alma_output_path(fmt, results):
+def get_alma_output_path(fmt, success_count):
     """Save Alma import CSV to AI_Music_Operations folder if env var is set."""
     ops_dir = os.environ.get("AI_MUSIC_OPERATIONS_DIR")
     if ops_dir:
         subfolder = os.path.join(ops_dir, "alma-imports", fmt)
         os.makedirs(subfolder, exist_ok=True)
         date_str = datetime.now().strftime('%Y-%m-%d')
-        success_count = len([r for r in results if r.get('status') == 'success'])
         filename = f"{date_str}_{fmt.upper()}-{success_count}-records-alma-import.csv"
         return os.path.join(subfolder, filename)
     return None
 
 
-def write_id_table(results, input_file_path):
-    """Write created record IDs to CSV with consistent naming."""
-    # Console table
+class IdTableWriter:
+    """
+    Stream created record IDs to CSV as each record succeeds.
+
+    The AI_Music_Operations filename carries the success count, which is only
+    known at the end, so there the table is written under an in-progress name
+    and renamed by close().
+    """
+
+    HEADER = ["MMS ID", "Holding ID", "Item ID", "OCLC", "Barcode", "Title", "Format", "Material Type", "OCLC Source"]
+
+    def __init__(self, input_file_path, fmt):
+        self.fmt = fmt
+        self.success_count = 0
+        timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
+        ops_dir = os.environ.get("AI_MUSIC_OPERATIONS_DIR")
+        self.rename_on_close = bool(ops_dir)
+        if ops_dir:
+            subfolder = os.path.join(ops_dir, "alma-imports", fmt)
+            os.makedirs(subfolder, exist_ok=True)
+            self.path = os.path.join(subfolder, f"{timestamp}_{fmt.upper()}-in-progress-alma-import.csv")
+        else:
+            input_dir = os.path.dirname(input_file_path)
+            self.path = os.path.join(input_dir, f"alma-import-ids-{timestamp}.csv")
+
+        self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.HEADER)
+
+    def write(self, r):
+        """Append one successful record and flush it to disk."""
+        self._writer.writerow([
+            r.get('mms_id',''),
+            r.get('holding_id',''),
+            r.get('item_pid',''),
+            r.get('oclc',''),
+            r.get('barcode',''),
+            r.get('title',''),
+            r.get('format',''),
+            r.get('material_type',''),
+            r.get('oclc_source',''),
+        ])
+        self._file.flush()
+        self.success_count += 1
+
+    def close(self):
+        """Close the table, give it its final name, and return the path."""
+        if self._file.closed:
+            return self.path
+        self._file.close()
+        if self.rename_on_close:
+            final_path = get_alma_output_path(self.fmt, self.success_count)
+            os.replace(self.path, final_path)
+            self.path = final_path
+        return self.path
+
+
+def print_id_table(csv_path):
+    """Echo the created record IDs from the finished CSV to the console."""
     print("\n" + "-"*60)
     print("CREATED RECORD IDS")
     print("-"*60)
     print("MMS ID | Holding ID | Item ID")
-    for r in results:
-        if r.get('status') == 'success':
-            print(f"{r.get('mms_id','')} | {r.get('holding_id','')} | {r.get('item_pid','')}")
-
-    # Save to AI_Music_Operations if env var set, otherwise next to input file
-    ops_path = get_alma_output_path("cd", results)
-    if ops_path:
-        csv_path = ops_path
-    else:
-        input_dir = os.path.dirname(input_file_path)
-        timestamp = datetime.now().strftime('%Y-%m-%d-%H-%M-%S')
-        csv_path = os.path.join(input_dir, f"alma-import-ids-{timestamp}.csv")
-
-    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-        w = csv.writer(f)
-        w.writerow(["MMS ID", "Holding ID", "Item ID", "OCLC", "Barcode", "Title", "Format", "Material Type", "OCLC Source"])
-        for r in results:
-            if r.get('status') == 'success':
-                w.writerow([
-                    r.get('mms_id',''),
-                    r.get('holding_id',''),
-                    r.get('item_pid',''),
-                    r.get('oclc',''),
-                    r.get('barcode',''),
-                    r.get('title',''),
-                    r.get('format',''),
-                    r.get('material_type',''),
-                    r.get('oclc_source',''),
-                ])
+
+    # Read back from disk so the IDs never have to be held in memory
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        sys.stdout.writelines(" | ".join(row[:3]) + "\n" for row in reader)
+
     print(f"\nCreated record IDs written to: {csv_path}")
-    return csv_path
 
 
-def archive_input_file(input_file_path, fmt, results):
+def archive_input_file(input_file_path, fmt, success_count):
     """Copy input batch file to AI_Music_Operations folder after successful run."""
     ops_dir = os.environ.get("AI_MUSIC_OPERATIONS_DIR")
     if not ops_dir:
         return
-    success_count = len([r for r in results if r.get('status') == 'success'])
     subfolder = os.path.join(ops_dir, "alma-batch-inputs", fmt)
     os.makedirs(subfolder, exist_ok=True)
     date_str = datetime.now().strftime('%Y-%m-%d')
@@ -964,49 +1395,60 @@ def archive_input_file(input_file_path, fmt, results):
     print(f"         Input file archived to: {dest}")
 
 
-def print_summary(results, input_file_path):
-    """Print a console summary and write the CSV ID table."""
+def print_summary(summary, input_file_path):
+    """Print a console summary and the CSV ID table."""
     print("\n" + "="*60)
     print("PROCESSING SUMMARY")
     print("="*60)
 
-    success = [r for r in results if r['status'] == 'success']
-    errors = [r for r in results if r['status'] == 'error']
-    already_exists = [r for r in results if r['status'] == 'already_exists']
+    errors = summary['errors']
+    already_exists = summary['already_exists']
+    warnings = summary['warnings']
 
-    print(f"Total processed: {len(results)}")
-    print(f"Successfully imported: {len(success)}")
+    print(f"Total processed: {summary['processed']}")
+    print(f"Successfully imported: {summary['success']}")
     print(f"Already exist in Alma: {len(already_exists)}")
     print(f"Failed: {len(errors)}")
+    if warnings:
+        print(f"Imported with warnings: {len(warnings)}")
 
+    # Each section is built in memory and written in one call rather than ~4 prints per record
     if already_exists:
-        print("\n" + "-"*60)
-        print("RECORDS ALREADY IN ALMA:")
-        print("-"*60)
+        lines = ["", "-"*60, "RECORDS ALREADY IN ALMA:", "-"*60]
         for r in already_exists:
-            print(f"\nOCLC: {r['oclc']}")
-            print(f"Barcode: {r['barcode']}")
+            lines.append(f"\nOCLC: {r['oclc']}")
+            lines.append(f"Barcode: {r['barcode']}")
             if r.get('title'):
-                print(f"Title: {r['title'][:60]}")
-            print(f"MMS ID: {r['mms_id']}")
+                lines.append(f"Title: {r['title'][:60]}")
+            lines.append(f"MMS ID: {r['mms_id']}")
+        sys.stdout.write("\n".join(lines) + "\n")
+
+    if warnings:
+        lines = ["", "-"*60, "IMPORTED WITH WARNINGS (still suppressed from discovery):", "-"*60]
+        for r in warnings:
+            lines.append(f"\nOCLC: {r['oclc']}")
+            lines.append(f"Barcode: {r['barcode']}")
+            lines.append(f"MMS ID: {r['mms_id']} | Holding ID: {r['holding_id']} | Item ID: {r['item_pid']}")
+            lines.append(f"Warning: {r['warning']}")
+        sys.stdout.write("\n".join(lines) + "\n")
 
     if errors:
-        print("\n" + "-"*60)
-        print("FAILED RECORDS:")
-        print("-"*60)
+        lines = ["", "-"*60, "FAILED RECORDS:", "-"*60]
         for r in errors:
-            print(f"\nOCLC: {r['oclc']}")
-            print(f"Barcode: {r['barcode']}")
+            lines.append(f"\nOCLC: {r['oclc']}")
+            lines.append(f"Barcode: {r['barcode']}")
             if r.get('title'):
-                print(f"Title: {r['title'][:60]}")
-            print(f"Error: {r.get('error', 'Unknown error')}")
+                lines.append(f"Title: {r['title'][:60]}")
+            lines.append(f"Error: {r.get('error', 'Unknown error')}")
+        sys.stdout.write("\n".join(lines) + "\n")
 
-    # Write CSV of created IDs
-    csv_path = write_id_table(results, input_file_path)
+    # The CSV of created IDs was streamed during processing
+    csv_path = summary['csv_path']
+    print_id_table(csv_path)
     print(f"\nID table written to CSV: {csv_path}")
 
     # Archive input batch file to AI_Music_Operations
-    archive_input_file(input_file_path, "cd", results)
+    archive_input_file(input_file_path, "cd", summary['success'])
     print("="*60)
 
 if __name__ == "__main__":
@@ -1043,10 +1485,22 @@ if __name__ == "__main__":
         default=None,
         help='Only allow input files under this directory.'
     )
+
+    parser.add_argument(
+        '--prefetch-existing',
+        action='store_true',
+        help='Refresh the local OCLC -> MMS ID map from the ALMA_OCLC_MAP_REPORT Analytics report before importing.'
+    )
     
     # --- main selection logic ---
     args = parser.parse_args()
 
+    if len(args.delimiter) != 1:
+        parser.error("--delimiter must be a single character")
+
+    if args.prefetch_existing and not OCLC_MAP_REPORT:
+        parser.error("--prefetch-existing requires ALMA_OCLC_MAP_REPORT (Analytics report path)")
+
     # Mandatory file, validated
     input_file = validate_input_file(args.input_file)
 
@@ -1068,8 +1522,12 @@ if __name__ == "__main__":
 
     # Execute
     try:
-        results = process_file(input_file, delimiter=args.delimiter)
-        print_summary(results, input_file)
+        if args.prefetch_existing:
+            print(f"Prefetching existing OCLC numbers from {OCLC_MAP_REPORT}...")
+            mapped = prefetch_oclc_map(OCLC_MAP_REPORT)
+            print(f"Saved {mapped} OCLC numbers to {OCLC_MAP_PATH}")
+        summary = process_file(input_file, delimiter=args.delimiter)
+        print_summary(summary, input_file)
     except KeyboardInterrupt:
         print("\n\nProcess interrupted by user.")
     except Exception as e:
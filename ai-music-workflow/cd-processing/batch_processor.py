@@ -5,14 +5,28 @@ This module provides batch processing capabilities for OpenAI API calls,
 offering significant cost savings (50% discount) and higher rate limits
 for large-scale CD metadata processing.
 
+Status output goes through the "batch_processor" logger, which prints bare
+messages to stdout by default. Quiet the polling chatter with
+logging.getLogger("batch_processor").setLevel(logging.WARNING).
+
 """
 
 import os
+import sys
 import json
+import logging
 import time
-import uuid
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+import random
+import shutil
+import gzip
+import hashlib
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from datetime import datetime
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Union
+import httpx
 from openai import OpenAI
 import tempfile
 from cd_workflow_config import get_model_config, get_token_limit_param, get_temperature_param
@@ -20,15 +34,255 @@ from cd_workflow_config import get_model_config, get_token_limit_param, get_temp
 # Custom module
 from model_pricing import estimate_cost
 
+# Messages are formatted lazily (%-style), so disabled levels cost nothing. Unless the
+# caller has configured this logger, it prints like print() did: bare lines on stdout.
+logger = logging.getLogger(__name__)
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# orjson serializes/parses the (image-heavy) JSONL batch files several times faster
+# and works in bytes directly; fall back to the stdlib with the same compact output
+# (orjson also writes datetimes as ISO 8601, matching datetime.isoformat() for the
+# naive timestamps kept in batch state)
+try:
+    import orjson
+
+    def _jsonl_line(obj: Any) -> bytes:
+        return orjson.dumps(obj) + b'\n'
+
+    _json_dumps_bytes = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    def _jsonl_line(obj: Any) -> bytes:
+        return (json.dumps(obj, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+
+    def _json_dumps_bytes(obj: Any) -> bytes:
+        return json.dumps(
+            obj, separators=(',', ':'), ensure_ascii=False,
+            default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value)
+        ).encode('utf-8')
+
+    _json_loads = json.loads
+
+# tiktoken counts prompt text exactly (and in native code); without it, cost estimates
+# fall back to the ~4 characters per token rule of thumb
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+@lru_cache(maxsize=8)
+def _get_token_encoding(model_name: str):
+    """tiktoken encoding for a model, or None when tiktoken (or its BPE data) is unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            # Model names newer than the installed tiktoken; current models use o200k
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # The BPE files are downloaded on first use and may be unreachable
+        return None
+
+def _serialize(batch_requests: Iterable[Dict[str, Any]]) -> List[bytes]:
+    """Serialize batch requests to JSONL lines (bytes, newline-terminated)."""
+    return [_jsonl_line(request) for request in batch_requests]
+
+_WRITE_SLICE_BYTES = 8 * 1024 * 1024
+
+def _write_jsonl_temp(lines: Iterable[bytes], suffix: str = '.jsonl') -> str:
+    """
+    Write pre-serialized JSONL lines to a new temp file and return its path.
+
+    Writes straight to the file descriptor in ~8 MB slices, so there is no buffered
+    file object in between and never more than one slice joined in memory.
+    """
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        def flush(buf: List[bytes]) -> None:
+            view = memoryview(b''.join(buf))
+            while view:
+                view = view[os.write(fd, view):]
+
+        buf, buf_len = [], 0
+        for line in lines:
+            buf.append(line)
+            buf_len += len(line)
+            if buf_len >= _WRITE_SLICE_BYTES:
+                flush(buf)
+                buf, buf_len = [], 0
+        if buf:
+            flush(buf)
+    except BaseException:
+        os.close(fd)
+        os.unlink(path)
+        raise
+    os.close(fd)
+    return path
+
 # --- ADD helper functions (module level or as @staticmethods on BatchProcessor) ---
+# Step configs are static for the life of the process, so look each one up once
+@lru_cache(maxsize=32)
+def _get_step_config(step_name: str) -> Dict[str, Any]:
+    return get_model_config(step_name)
+
 def _get_batch_threshold(step_name: str) -> int:
-    cfg = get_model_config(step_name)
+    cfg = _get_step_config(step_name)
     return int(cfg.get("batch_threshold", 11))
 
 def _get_step_model(step_name: str) -> str:
-    cfg = get_model_config(step_name)
+    cfg = _get_step_config(step_name)
     return cfg.get("model", "gpt-4o-mini-2024-07-18")
 
+@lru_cache(maxsize=64)
+def _get_model_params(model_name: str, max_tokens: int, temperature: float) -> Dict[str, Any]:
+    """Token-limit and temperature parameters for a model (shared dict; spread it, don't mutate it)."""
+    return {
+        **get_token_limit_param(model_name, max_tokens),
+        **get_temperature_param(model_name, temperature)
+    }
+
+def _remove_files(paths: Iterable[str]) -> None:
+    for path in paths:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
+
+def _remove_files_in_background(paths: List[str]) -> None:
+    """Delete temp files on a daemon thread so the caller gets its results without waiting."""
+    threading.Thread(target=_remove_files, args=(paths,), daemon=True).start()
+
+def _next_poll_interval(polls_in_status: int, max_interval: float = 300) -> float:
+    """
+    Seconds to wait before the next status check: 5 s doubling per unchanged poll,
+    capped at max_interval, plus up to 5 s of jitter. Callers reset polls_in_status
+    to 0 whenever a batch's status changes, so small jobs are picked up quickly and
+    long ones are not polled every minute for hours.
+    """
+    return min(max_interval, 5 * 2 ** min(polls_in_status, 6)) + random.uniform(0, 5)
+
+# Results of fully successful batches, keyed by a hash of the request content, so an
+# identical re-run (e.g. after a crash) is answered locally instead of re-submitted.
+# OPENAI_BATCH_RESULT_CACHE=0 turns it off for every step (fresh model output every run);
+# entries older than OPENAI_BATCH_RESULT_CACHE_DAYS are neither used nor kept.
+RESULT_CACHE_DIR = os.path.expanduser("~/.cache/ai-music-batch")
+RESULT_CACHE_ENABLED = os.getenv("OPENAI_BATCH_RESULT_CACHE", "1").lower() not in ("0", "false", "no")
+RESULT_CACHE_MAX_AGE_SECONDS = float(os.getenv("OPENAI_BATCH_RESULT_CACHE_DAYS", "7")) * 86400
+
+def _prune_result_cache(max_age_seconds: float = RESULT_CACHE_MAX_AGE_SECONDS) -> int:
+    """Delete cached results older than max_age_seconds; returns how many were removed."""
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    try:
+        entries = list(os.scandir(RESULT_CACHE_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        with contextlib.suppress(OSError):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+    return removed
+
+def _results_cache_key(batch_requests: List[Dict[str, Any]], lines: List[bytes]) -> str:
+    """
+    Hash the serialized requests, minus their custom_ids.
+
+    custom_ids carry a random per-call suffix, so each one is cut out of its line
+    before hashing; identical requests in the same order then hash the same.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    for request, line in zip(batch_requests, lines):
+        digest.update(line.replace(_jsonl_line(request.get("custom_id", ""))[:-1], b'', 1))
+    return digest.hexdigest()
+
+# Concurrent chunk uploads, polls and downloads all share one client; httpx's default
+# pool (10 connections) would queue them. Uploads/downloads of large JSONL files get
+# long read/write timeouts, while connecting and waiting for a pooled connection stay short.
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+HTTP_TIMEOUT = httpx.Timeout(connect=10, read=600, write=600, pool=10)
+
+# With the optional h2 package (pip install "httpx[http2]") requests are multiplexed over
+# HTTP/2, so a pass of concurrent polls can share one connection and TLS handshake
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Client-side request budget for the OpenAI file/batch endpoints, and how many times the
+# SDK retries 429s, timeouts and 5xx responses (exponential backoff, honours Retry-After)
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_BATCH_RPM", "600"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+
+class _RateLimiter:
+    """
+    Token bucket for outgoing OpenAI requests.
+
+    Refills continuously at requests_per_minute / 60 per second and holds up to one
+    second's worth, so bursts of concurrent polls are smoothed instead of drawing 429s.
+    As with AlmaRateLimiter, an empty bucket is reserved under the lock (the balance
+    goes negative) and the caller sleeps after releasing it.
+    """
+
+    def __init__(self, requests_per_minute: float):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1.0, float(int(self.rate)))
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take one token, waiting for the bucket to refill if it is empty."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+# Batch statuses that never change again, and how long a non-terminal status is reused
+TERMINAL_BATCH_STATUSES = frozenset({"completed", "failed", "expired", "cancelled"})
+STATUS_CACHE_TTL_SECONDS = 5.0
+
+# Shared by every BatchProcessor in the process, since they share one account's limits
+_openai_rate_limiter = _RateLimiter(OPENAI_REQUESTS_PER_MINUTE)
+
+def _make_batch_request(index: int, req_data: Dict[str, Any], custom_id_prefix: str, run_id: str,
+                        default_model: str, default_max_tokens: int,
+                        default_temperature: float) -> Dict[str, Any]:
+    """Build one /v1/chat/completions batch line from caller request data and step defaults."""
+    # Requests that are already in batch-line shape go out as-is
+    if "custom_id" in req_data and "body" in req_data:
+        return req_data
+
+    model_name = req_data.get("model", default_model)
+
+    # Build the body with model-appropriate token and temperature parameters
+    body = {
+        "model": model_name,
+        "messages": req_data["messages"],
+        **_get_model_params(model_name,
+                            req_data.get("max_tokens", default_max_tokens),
+                            req_data.get("temperature", default_temperature))
+    }
+    if (response_format := req_data.get("response_format")) is not None:
+        body["response_format"] = response_format
+
+    return {
+        "custom_id": f"{custom_id_prefix}_{index}_{run_id}",
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": body
+    }
+
 class BatchProcessor:
     """
     Handles OpenAI Batch API operations with robust error handling and monitoring.
@@ -51,7 +305,20 @@ class BatchProcessor:
             default_step: Default workflow step name
             persistence_dir: Directory to store batch state (defaults to ~/.ai-music-batch-state)
         """
-        self.client = OpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'))
+        # One keep-alive session for every call this processor makes; the request hook
+        # runs for every HTTP request, SDK retries included
+        self._http = httpx.Client(
+            http2=HTTP2_AVAILABLE,
+            limits=HTTP_LIMITS,
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+            event_hooks={"request": [lambda request: _openai_rate_limiter.acquire()]},
+        )
+        self.client = OpenAI(
+            api_key=api_key or os.getenv('OPENAI_API_KEY'),
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=self._http,
+        )
         self.batch_jobs = {}  # Track active batch jobs
         self.default_step = default_step  # used when caller doesn't pass step_name
 
@@ -62,8 +329,24 @@ class BatchProcessor:
         os.makedirs(self.persistence_dir, exist_ok=True)
 
         self.state_file = os.path.join(self.persistence_dir, "batch_state.json")
+        # Chunk results are downloaded from worker threads, which all update batch_jobs
+        self._state_lock = threading.RLock()
+        # Last snapshot written by _save_state, so unchanged state is not rewritten
+        self._saved_state: Optional[bytes] = None
+        # batch_id -> (time.monotonic() of the retrieve, status_info)
+        self._status_cache: Dict[str, tuple] = {}
         self._load_state()
 
+    def close(self) -> None:
+        """Close the HTTP connections held by this processor."""
+        self._http.close()
+
+    def __enter__(self) -> "BatchProcessor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     def _load_state(self):
         """Load batch state from disk if it exists."""
         if os.path.exists(self.state_file):
@@ -76,25 +359,30 @@ class BatchProcessor:
                             info["created_at"] = datetime.fromisoformat(info["created_at"])
                         self.batch_jobs[batch_id] = info
                     if self.batch_jobs:
-                        print(f"Loaded {len(self.batch_jobs)} existing batch job(s) from state file")
+                        logger.info("Loaded %s existing batch job(s) from state file", len(self.batch_jobs))
             except Exception as e:
-                print(f"Warning: Failed to load batch state: {e}")
+                logger.warning("Warning: Failed to load batch state: %s", e)
 
     def _save_state(self):
         """Save current batch state to disk."""
         try:
-            # Convert datetime objects to ISO format strings for JSON serialization
-            serializable_state = {}
-            for batch_id, info in self.batch_jobs.items():
-                serializable_info = info.copy()
-                if "created_at" in serializable_info and isinstance(serializable_info["created_at"], datetime):
-                    serializable_info["created_at"] = serializable_info["created_at"].isoformat()
-                serializable_state[batch_id] = serializable_info
-
-            with open(self.state_file, 'w') as f:
-                json.dump(serializable_state, f, indent=2)
+            with self._state_lock:
+                # datetimes serialize straight to ISO strings, so entries need no copying
+                data = _json_dumps_bytes(self.batch_jobs)
+                if data == self._saved_state:
+                    return
+                
+                # Write, fsync, then rename: the state file is always either the old or
+                # the new snapshot, even if the process or machine dies mid-save
+                tmp_path = self.state_file + ".tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.state_file)
+                self._saved_state = data
         except Exception as e:
-            print(f"Warning: Failed to save batch state: {e}")
+            logger.warning("Warning: Failed to save batch state: %s", e)
 
     def list_active_batches(self) -> List[Dict[str, Any]]:
         """
@@ -117,7 +405,7 @@ class BatchProcessor:
                     }
                     active_batches.append(batch_info)
             except Exception as e:
-                print(f"Warning: Could not check status for batch {batch_id}: {e}")
+                logger.warning("Warning: Could not check status for batch %s: %s", batch_id, e)
         return active_batches
 
     def resume_batch(self, batch_id: str, max_wait_hours: int = 24, check_interval_minutes: int = 5) -> Optional[List[Dict[str, Any]]]:
@@ -132,14 +420,14 @@ class BatchProcessor:
         Returns:
             Batch results or None if failed
         """
-        print(f"Resuming batch {batch_id}...")
+        logger.info("Resuming batch %s...", batch_id)
 
         # Check if batch exists in state
         if batch_id not in self.batch_jobs:
             # Try to get info from OpenAI directly
             status_info = self.check_batch_status(batch_id)
             if "error" in status_info:
-                print(f"Batch {batch_id} not found in state or OpenAI")
+                logger.warning("Batch %s not found in state or OpenAI", batch_id)
                 return None
 
             # Add to state
@@ -160,15 +448,29 @@ class BatchProcessor:
             status_info = self.check_batch_status(batch_id)
             if "error" not in status_info:
                 status = status_info.get("status")
-                if status in ["completed", "failed", "expired", "cancelled"]:
+                if status in TERMINAL_BATCH_STATUSES:
                     batches_to_remove.append(batch_id)
 
         for batch_id in batches_to_remove:
             del self.batch_jobs[batch_id]
+            self.invalidate_status(batch_id)
 
         if batches_to_remove:
             self._save_state()
-            print(f"Cleaned up {len(batches_to_remove)} completed batch(es) from state")
+            logger.info("Cleaned up %s completed batch(es) from state", len(batches_to_remove))
+
+        # A split-batch checkpoint is resumable while one of its chunks is tracked, and also
+        # after its tracked chunks are gone if it holds retrieved chunk results: a retried
+        # run reuses those instead of paying for them again. Those expire with the result cache.
+        live_runs = {f"run_{info['run_key']}" for info in self.batch_jobs.values() if info.get("run_key")}
+        cutoff = time.time() - RESULT_CACHE_MAX_AGE_SECONDS
+        stale_runs = [name for name in os.listdir(self.persistence_dir)
+                      if name.startswith("run_") and name not in live_runs
+                      and not self._has_chunk_results(os.path.join(self.persistence_dir, name), cutoff)]
+        for name in stale_runs:
+            shutil.rmtree(os.path.join(self.persistence_dir, name), ignore_errors=True)
+        if stale_runs:
+            logger.info("Removed %s stale split-batch checkpoint(s)", len(stale_runs))
 
 
     def should_use_batch(self, num_requests: int, force_batch: bool = False, step_name: Optional[str] = None) -> bool:
@@ -202,38 +504,27 @@ class BatchProcessor:
         Convert request data into OpenAI batch format.
 
         Args:
-            requests_data: List of dictionaries containing request parameters
+            requests_data: List of dictionaries containing request parameters (entries that
+                already have "custom_id" and "body" are passed through unchanged)
             custom_id_prefix: Prefix for custom request IDs
             step_name: Workflow step name to derive defaults from config
         """
-        batch_requests = []
         step = step_name or self.default_step
+        # Step defaults are resolved once, outside the per-request loop
+        cfg = _get_step_config(step)
         default_model = _get_step_model(step)
+        default_max_tokens = cfg.get("max_tokens", 2000)
+        default_temperature = cfg.get("temperature", 0)
 
-        for i, req_data in enumerate(requests_data):
-            model_name = req_data.get("model", default_model)
-            max_tokens_value = req_data.get("max_tokens", get_model_config(step).get("max_tokens", 2000))
-            temperature_value = req_data.get("temperature", get_model_config(step).get("temperature", 0))
-
-            # Build the body with model-appropriate token and temperature parameters
-            body = {
-                "model": model_name,
-                "messages": req_data["messages"],
-                **get_token_limit_param(model_name, max_tokens_value),
-                **get_temperature_param(model_name, temperature_value)
-            }
+        # The index keeps IDs unique within a batch; one random suffix per call is
+        # enough to tell batches apart, so no per-request entropy is drawn
+        run_id = os.urandom(4).hex()
 
-            batch_request = {
-                "custom_id": f"{custom_id_prefix}_{i}_{uuid.uuid4().hex[:8]}",
-                "method": "POST",
-                "url": "/v1/chat/completions",
-                "body": body
-            }
-            if "response_format" in req_data:
-                batch_request["body"]["response_format"] = req_data["response_format"]
-            batch_requests.append(batch_request)
-
-        return batch_requests
+        return [
+            _make_batch_request(i, req_data, custom_id_prefix, run_id,
+                                default_model, default_max_tokens, default_temperature)
+            for i, req_data in enumerate(requests_data)
+        ]
 
     
     def estimate_batch_cost(self, batch_requests: List[Dict[str, Any]],
@@ -252,26 +543,36 @@ class BatchProcessor:
         # More sophisticated token estimation based on request content
         total_estimated_prompt_tokens = 0
         total_estimated_completion_tokens = 0
+        model_for_pricing = model_name or _get_step_model(step_name or self.default_step)
+        encoding = _get_token_encoding(model_for_pricing)
+        
+        # With tiktoken, every text part is collected and encoded in one batch call
+        texts = []
         
         for request in batch_requests:
-            # Estimate prompt tokens based on message content
-            prompt_text = ""
+            # Estimate prompt tokens based on message content. Without tiktoken only the
+            # character count matters, so sum lengths rather than concatenating the text.
+            text_len = 0
             image_count = 0
             
             for message in request.get("messages", []):
                 content = message.get("content", "")
                 if isinstance(content, str):
-                    prompt_text += content
+                    text_len += len(content)
+                    texts.append(content)
                 elif isinstance(content, list):
                     # Handle multi-modal content (text + images)
                     for item in content:
-                        if item.get("type") == "text":
-                            prompt_text += item.get("text", "")
-                        elif item.get("type") == "image_url":
+                        item_type = item.get("type")
+                        if item_type == "text":
+                            text = item.get("text", "")
+                            text_len += len(text)
+                            texts.append(text)
+                        elif item_type == "image_url":
                             image_count += 1
             
-            # Rough token estimation: ~4 characters per token
-            estimated_prompt_tokens = len(prompt_text) // 4
+            # Rough token estimation: ~4 characters per token (replaced below with tiktoken)
+            estimated_prompt_tokens = 0 if encoding else text_len // 4
             
             # Images add significant tokens - rough estimate based on OpenAI pricing
             # High-res images can be 1000+ tokens each
@@ -288,12 +589,16 @@ class BatchProcessor:
             estimated_completion_tokens = int(max_tokens * 0.6)
             total_estimated_completion_tokens += estimated_completion_tokens
         
-        print(f" Token Estimation:")
-        print(f"   Estimated prompt tokens: {total_estimated_prompt_tokens:,}")
-        print(f"   Estimated completion tokens: {total_estimated_completion_tokens:,}")
-        print(f"   Total estimated tokens: {total_estimated_prompt_tokens + total_estimated_completion_tokens:,}")
+        if encoding:
+            total_estimated_prompt_tokens += sum(
+                map(len, encoding.encode_ordinary_batch(texts, num_threads=8))
+            )
+        
+        logger.info(" Token Estimation:")
+        logger.info("   Estimated prompt tokens: %s", format(total_estimated_prompt_tokens, ","))
+        logger.info("   Estimated completion tokens: %s", format(total_estimated_completion_tokens, ","))
+        logger.info("   Total estimated tokens: %s", format(total_estimated_prompt_tokens + total_estimated_completion_tokens, ","))
         
-        model_for_pricing = model_name or _get_step_model(step_name or self.default_step)
         return estimate_cost(
             model_name=model_for_pricing,
             estimated_prompt_tokens=total_estimated_prompt_tokens,
@@ -313,21 +618,21 @@ class BatchProcessor:
         Returns:
             Batch job ID
         """
-        # Create temporary file for batch requests
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.jsonl', delete=False) as f:
-            for request in batch_requests:
-                f.write(json.dumps(request) + '\n')
-            temp_file_path = f.name
+        # Spool the batch file in memory; only batches over _WRITE_SLICE_BYTES roll over
+        # to an anonymous temp file, which is removed when the spool closes
+        spool = tempfile.SpooledTemporaryFile(max_size=_WRITE_SLICE_BYTES, mode='w+b')
         
         try:
-            print(f" Uploading batch file with {len(batch_requests)} requests...")
+            spool.writelines(map(_jsonl_line, batch_requests))
+            spool.seek(0)
+            
+            logger.info(" Uploading batch file with %s requests...", len(batch_requests))
             
             # Upload the batch file
-            with open(temp_file_path, 'rb') as f:
-                batch_input_file = self.client.files.create(
-                    file=f,
-                    purpose="batch"
-                )
+            batch_input_file = self.client.files.create(
+                file=("batch.jsonl", spool),
+                purpose="batch"
+            )
             
             # Create the batch job
             batch_job = self.client.batches.create(
@@ -346,78 +651,161 @@ class BatchProcessor:
                 "created_at": datetime.now(),
                 "request_count": len(batch_requests),
                 "description": description,
-                "input_file_id": batch_input_file.id,
-                "temp_file_path": temp_file_path
+                "input_file_id": batch_input_file.id
             }
 
             # Persist to disk immediately
             self._save_state()
 
-            print(f" Batch job submitted successfully!")
-            print(f"   Batch ID: {batch_job.id}")
-            print(f"   Requests: {len(batch_requests)}")
-            print(f"   Status: {batch_job.status}")
-            print(f"   Batch state saved to: {self.state_file}")
+            logger.info(" Batch job submitted successfully!")
+            logger.info("   Batch ID: %s", batch_job.id)
+            logger.info("   Requests: %s", len(batch_requests))
+            logger.info("   Status: %s", batch_job.status)
+            logger.info("   Batch state saved to: %s", self.state_file)
 
             return batch_job.id
             
         except Exception as e:
-            print(f" Failed to submit batch job: {str(e)}")
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            logger.error(" Failed to submit batch job: %s", e)
             raise
+        finally:
+            spool.close()
     
     def submit_adaptive_batch(self, batch_requests: List[Dict[str, Any]], 
                             custom_id_mapping: Dict[str, Any],
                             description: str = "",
-                            max_file_size_mb: int = 180) -> List[Dict[str, Any]]:
+                            max_file_size_mb: int = 180,
+                            use_result_cache: bool = True) -> List[Dict[str, Any]]:
         """
         Submit batch requests with adaptive splitting based on file size.
-        Creates the full batch file, then splits if needed, maintaining order.
+        Measures the serialized size first and writes only what gets uploaded: one
+        file if it fits, otherwise just the chunk files, maintaining order.
         
         Args:
             batch_requests: List of formatted batch requests
             custom_id_mapping: Mapping of custom IDs to original data
             description: Optional description for the batch job
             max_file_size_mb: Maximum file size in MB before splitting
+            use_result_cache: Reuse results of an identical, fully successful earlier
+                batch from RESULT_CACHE_DIR instead of submitting again (also needs
+                OPENAI_BATCH_RESULT_CACHE, on by default). Pass False to force a fresh run.
             
         Returns:
             Combined results from all batches
         """
-        print(f"Creating batch file for {len(batch_requests)} requests...")
+        logger.info("Creating batch file for %s requests...", len(batch_requests))
+        
+        # Serialize every request once; the summed line lengths give the file size
+        # without writing it, and the split path reuses the same bytes
+        lines = _serialize(batch_requests)
         
-        # Create full batch file first
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.jsonl', delete=False) as f:
-            for request in batch_requests:
-                f.write(json.dumps(request) + '\n')
-            full_batch_path = f.name
+        # A fresh run neither reads the cache nor resumes earlier split-batch checkpoints
+        use_result_cache = use_result_cache and RESULT_CACHE_ENABLED
+        cache_key = _results_cache_key(batch_requests, lines) if use_result_cache else None
+        if cache_key:
+            cached_results = self._load_cached_results(cache_key, batch_requests)
+            if cached_results is not None:
+                logger.info("Reusing cached results for an identical batch (%s results)", len(cached_results))
+                return cached_results
         
-        # Check file size
-        file_size = os.path.getsize(full_batch_path)
-        file_size_mb = file_size / (1024 * 1024)
+        # The cache key doubles as the checkpoint key for split batches, so a re-run after
+        # an interruption picks up the chunks that already finished
+        custom_ids = [request.get("custom_id") for request in batch_requests] if cache_key else None
+        results = self._submit_lines(lines, description, max_file_size_mb, custom_ids, cache_key)
+        if cache_key and results:
+            self._store_cached_results(cache_key, batch_requests, results)
+        return results
+
+    def _submit_lines(self, lines: List[bytes], description: str, max_file_size_mb: int,
+                      custom_ids: Optional[List[str]] = None,
+                      run_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Submit serialized requests as one batch or as size-limited chunks and wait for results."""
+        file_size = sum(map(len, lines))
         
-        print(f"Full batch file size: {file_size_mb:.1f} MB")
+        logger.info("Full batch file size: %.1f MB", file_size / (1024 * 1024))
         
-        try:
-            if file_size_mb <= max_file_size_mb:
-                # Single batch processing
-                print("File size within limits, processing as single batch")
-                return self._process_single_batch_file(full_batch_path, description)
-            else:
-                # Split into multiple batches
-                print(f"File exceeds {max_file_size_mb} MB limit, splitting into chunks...")
-                return self._process_split_batches(full_batch_path, batch_requests, description, max_file_size_mb)
+        if file_size > max_file_size_mb * 1024 * 1024:
+            # Split into multiple batches
+            logger.info("File exceeds %s MB limit, splitting into chunks...", max_file_size_mb)
+            return self._process_split_batches(lines, description, max_file_size_mb, custom_ids, run_key)
+        
+        # Single batch processing
+        logger.info("File size within limits, processing as single batch")
+        if file_size <= _WRITE_SLICE_BYTES:
+            # Small enough to upload straight from memory, like submit_batch's spool
+            return self._process_single_batch_file(b''.join(lines), description)
+        
+        full_batch_path = _write_jsonl_temp(lines)
         
+        try:
+            return self._process_single_batch_file(full_batch_path, description)
         finally:
             # Clean up the full batch file
-            if os.path.exists(full_batch_path):
-                os.unlink(full_batch_path)
+            _remove_files_in_background([full_batch_path])
+
+    def _load_cached_results(self, cache_key: str,
+                             batch_requests: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results relabelled with this call's custom_ids, or None on a miss."""
+        cache_path = os.path.join(RESULT_CACHE_DIR, f"{cache_key}.jsonl.gz")
+        try:
+            if time.time() - os.path.getmtime(cache_path) > RESULT_CACHE_MAX_AGE_SECONDS:
+                # Too old to trust; the next store prunes it
+                return None
+            with gzip.open(cache_path, 'rb') as f:
+                results = [_json_loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable result cache %s: %s", cache_path, e)
+            return None
+        
+        # Cached results are labelled by request position; map back to the current IDs
+        custom_ids = [request["custom_id"] for request in batch_requests]
+        for result in results:
+            result["custom_id"] = custom_ids[int(result["custom_id"])]
+        return results
 
-    def _process_single_batch_file(self, batch_file_path: str, description: str) -> List[Dict[str, Any]]:
-        """Process a single batch file."""
-        with open(batch_file_path, 'rb') as f:
-            batch_input_file = self.client.files.create(file=f, purpose="batch")
+    def _store_cached_results(self, cache_key: str, batch_requests: List[Dict[str, Any]],
+                              results: List[Dict[str, Any]]) -> None:
+        """Cache the results of a batch in which every request succeeded."""
+        positions = {request["custom_id"]: i for i, request in enumerate(batch_requests)}
+        if len(results) != len(positions) or not all(
+            result.get("error") is None
+            and (result.get("response") or {}).get("status_code") == 200
+            and result.get("custom_id") in positions
+            for result in results
+        ):
+            return
+        
+        cache_path = os.path.join(RESULT_CACHE_DIR, f"{cache_key}.jsonl.gz")
+        tmp_path = cache_path + ".tmp"
+        try:
+            os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+            with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+                f.writelines(
+                    _jsonl_line({**result, "custom_id": str(positions[result["custom_id"]])})
+                    for result in results
+                )
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning("Could not write result cache %s: %s", cache_path, e)
+        
+        # Each store also drops expired entries, so the cache cannot grow without bound
+        _prune_result_cache()
+
+    def _submit_batch_file(self, batch_file: Union[str, bytes], description: str, **job_info: Any) -> str:
+        """
+        Upload one JSONL file, create its batch job, and record it in batch_jobs.
+
+        batch_file is a path, or the file's contents for batches small enough to upload
+        from memory. Safe to call from worker threads; the caller persists state with
+        _save_state(). Extra keyword arguments (e.g. chunk_num) are stored with the job info.
+        """
+        if isinstance(batch_file, bytes):
+            batch_input_file = self.client.files.create(file=("batch.jsonl", batch_file), purpose="batch")
+        else:
+            with open(batch_file, 'rb') as f:
+                batch_input_file = self.client.files.create(file=f, purpose="batch")
 
         batch_job = self.client.batches.create(
             input_file_id=batch_input_file.id,
@@ -426,157 +814,304 @@ class BatchProcessor:
             metadata={"description": description}
         )
 
-        # Store batch job info and persist
-        self.batch_jobs[batch_job.id] = {
-            "created_at": datetime.now(),
-            "description": description,
-            "input_file_id": batch_input_file.id
-        }
+        # Store batch job info
+        with self._state_lock:
+            self.batch_jobs[batch_job.id] = {
+                "created_at": datetime.now(),
+                "description": description,
+                "input_file_id": batch_input_file.id,
+                **job_info
+            }
+        return batch_job.id
+
+    def _process_single_batch_file(self, batch_file: Union[str, bytes], description: str) -> List[Dict[str, Any]]:
+        """Process a single batch file (a path, or its contents)."""
+        batch_id = self._submit_batch_file(batch_file, description)
         self._save_state()
 
-        print(f"Batch job submitted: {batch_job.id}")
-        print(f"Batch state saved to: {self.state_file}")
-        return self.wait_for_completion(batch_job.id)
+        logger.info("Batch job submitted: %s", batch_id)
+        logger.info("Batch state saved to: %s", self.state_file)
+        return self.wait_for_completion(batch_id)
 
-    def _process_split_batches(self, full_batch_path: str, batch_requests: List[Dict[str, Any]], 
-                            description: str, max_file_size_mb: int) -> List[Dict[str, Any]]:
-        """Split batch file and process chunks concurrently, maintaining order."""
+    def _process_split_batches(self, lines: List[bytes], description: str,
+                            max_file_size_mb: int,
+                            custom_ids: Optional[List[str]] = None,
+                            run_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Split serialized JSONL lines into chunk files and process them concurrently, maintaining order.
+
+        With a run_key (and the requests' custom_ids), each chunk's results are checkpointed
+        under persistence_dir as they arrive. A later call with the same key reuses those
+        chunks and resumes waiting on chunks still in flight instead of submitting again.
+        """
+        
+        # Greedily pack consecutive requests up to the byte limit. Request sizes vary
+        # a lot (image vs text-only), so a count-based split can overshoot or waste chunks.
+        limit_bytes = max_file_size_mb * 1024 * 1024
+        chunks = []
+        chunk_starts = []
+        current = []
+        current_bytes = 0
+        for position, line in enumerate(lines):
+            if current and current_bytes + len(line) > limit_bytes:
+                chunks.append(current)
+                current = []
+                current_bytes = 0
+            if not current:
+                chunk_starts.append(position)
+            current.append(line)
+            current_bytes += len(line)
+        if current:
+            chunks.append(current)
         
-        # Calculate optimal chunk size based on file size
-        file_size_mb = os.path.getsize(full_batch_path) / (1024 * 1024)
-        estimated_chunks = int(file_size_mb / max_file_size_mb) + 1
-        chunk_size = len(batch_requests) // estimated_chunks + 1
+        logger.info("Splitting into %s chunks of at most %s MB each", len(chunks), max_file_size_mb)
         
-        print(f"Splitting into approximately {estimated_chunks} chunks of ~{chunk_size} requests each")
+        def current_ids(i: int) -> List[str]:
+            return custom_ids[chunk_starts[i]:chunk_starts[i] + len(chunks[i])]
+        
+        # Chunk index -> results, and -> the custom_ids those results (or the batch in
+        # flight) were submitted with; earlier attempts used a different random suffix
+        chunk_results = {}
+        chunk_ids = {}
+        batch_ids = {}
+        run_dir = os.path.join(self.persistence_dir, f"run_{run_key}") if run_key and custom_ids else None
+        if run_dir:
+            os.makedirs(run_dir, exist_ok=True)
+            with self._state_lock:
+                in_flight = {
+                    info.get("chunk_num"): batch_id for batch_id, info in self.batch_jobs.items()
+                    if info.get("run_key") == run_key and info.get("total_chunks") == len(chunks)
+                }
+            for i in range(len(chunks)):
+                checkpoint = self._load_chunk_checkpoint(run_dir, i)
+                if checkpoint is None:
+                    continue
+                ids, results = checkpoint
+                if results is not None:
+                    chunk_ids[i], chunk_results[i] = ids, results
+                elif i + 1 in in_flight:
+                    chunk_ids[i], batch_ids[i] = ids, in_flight[i + 1]
+            if chunk_results or batch_ids:
+                logger.info("Resuming earlier run: %s chunk(s) already retrieved, %s still in flight",
+                            len(chunk_results), len(batch_ids))
         
-        chunk_files = []
-        batch_ids = []
+        to_submit = [i for i in range(len(chunks)) if i not in chunk_results and i not in batch_ids]
+        chunk_files = {}
         
         try:
             # Create all chunk files first
-            for chunk_idx in range(0, len(batch_requests), chunk_size):
-                chunk_requests = batch_requests[chunk_idx:chunk_idx + chunk_size]
-                
+            for chunk_idx in to_submit:
+                chunk_lines = chunks[chunk_idx]
                 # Create chunk file with properly indexed requests
-                chunk_num = chunk_idx // chunk_size
-                with tempfile.NamedTemporaryFile(mode='w', suffix=f'_chunk_{chunk_num}.jsonl', delete=False) as f:
-                    for request in chunk_requests:
-                        f.write(json.dumps(request) + '\n')
-                    chunk_file_path = f.name
-                
-                chunk_files.append(chunk_file_path)
-                chunk_size_mb = os.path.getsize(chunk_file_path) / (1024 * 1024)
-                chunk_num = chunk_idx // chunk_size + 1
-                total_chunks = (len(batch_requests) + chunk_size - 1) // chunk_size
+                chunk_files[chunk_idx] = _write_jsonl_temp(chunk_lines, suffix=f'_chunk_{chunk_idx}.jsonl')
+                chunk_size_mb = sum(map(len, chunk_lines)) / (1024 * 1024)
                 
-                print(f"Chunk {chunk_num}/{total_chunks}: {len(chunk_requests)} requests, {chunk_size_mb:.1f} MB")
+                logger.info("Chunk %s/%s: %s requests, %.1f MB", chunk_idx + 1, len(chunks), len(chunk_lines), chunk_size_mb)
             
-            # Submit all batches concurrently
-            print(f"\nSubmitting all {len(chunk_files)} batches concurrently...")
-            for i, chunk_file_path in enumerate(chunk_files):
-                chunk_num = i + 1
-                chunk_description = f"{description} - Chunk {chunk_num}/{len(chunk_files)}"
-                
+            def submit_chunk(i: int) -> str:
                 # Submit batch without waiting
-                with open(chunk_file_path, 'rb') as f:
-                    batch_input_file = self.client.files.create(file=f, purpose="batch")
-                
-                batch_job = self.client.batches.create(
-                    input_file_id=batch_input_file.id,
-                    endpoint="/v1/chat/completions",
-                    completion_window="24h",
-                    metadata={"description": chunk_description}
+                batch_id = self._submit_batch_file(
+                    chunk_files[i],
+                    f"{description} - Chunk {i + 1}/{len(chunks)}",
+                    chunk_num=i + 1,
+                    total_chunks=len(chunks),
+                    **({"run_key": run_key} if run_dir else {})
                 )
+                if run_dir:
+                    chunk_ids[i] = current_ids(i)
+                    self._write_chunk_checkpoint(run_dir, i, chunk_ids[i])
+                return batch_id
+            
+            # Submit all batches concurrently (upload + create per chunk). Eight uploads at
+            # a time stays well inside the OpenAI client's connection pool; map keeps chunk order.
+            if to_submit:
+                logger.info("\nSubmitting all %s batches concurrently...", len(to_submit))
+                with ThreadPoolExecutor(max_workers=min(8, len(to_submit))) as executor:
+                    for i, batch_id in zip(to_submit, executor.map(submit_chunk, to_submit)):
+                        batch_ids[i] = batch_id
+                        logger.info("Submitted chunk %s: %s", i + 1, batch_id)
 
-                # Store batch job info
-                self.batch_jobs[batch_job.id] = {
-                    "created_at": datetime.now(),
-                    "description": chunk_description,
-                    "input_file_id": batch_input_file.id,
-                    "chunk_num": chunk_num,
-                    "total_chunks": len(chunk_files)
-                }
-
-                batch_ids.append(batch_job.id)
-                print(f"Submitted chunk {chunk_num}: {batch_job.id}")
-
-            # Save state after all chunks are submitted
-            self._save_state()
-            print(f"All {len(batch_ids)} batch chunks saved to state: {self.state_file}")
+                # Save state after all chunks are submitted
+                self._save_state()
+                logger.info("All %s batch chunks saved to state: %s", len(to_submit), self.state_file)
             
             # Wait for all batches to complete
-            print(f"\nWaiting for all {len(batch_ids)} batches to complete...")
+            logger.info("\nWaiting for all %s batches to complete...", len(batch_ids))
             all_results = []
             
-            # Track completion status
-            completed_batches = {}
+            # Only chunks still in flight are polled: pending maps batch ID -> chunk index
+            # and shrinks as chunks finish. Per-chunk backoff state drives the poll interval.
+            pending = {batch_id: i for i, batch_id in sorted(batch_ids.items())}
+            failed_chunks = []
+            last_statuses = {}
+            polls_in_status = {}
             
-            while len(completed_batches) < len(batch_ids):
-                for i, batch_id in enumerate(batch_ids):
-                    if batch_id not in completed_batches:
-                        status_info = self.check_batch_status(batch_id)
-                        
+            def chunk_failed(i: int) -> None:
+                failed_chunks.append(i)
+                if run_dir:
+                    # Resubmit this chunk on the next attempt rather than resuming it
+                    self._remove_chunk_checkpoint(run_dir, i)
+            
+            # Each pass checks every pending chunk at once, so a pass costs one
+            # round-trip rather than one per chunk
+            with ThreadPoolExecutor(max_workers=max(1, min(32, len(pending)))) as executor:
+                while pending:
+                    polled = list(pending.items())
+                    statuses = executor.map(lambda batch_id: self.check_batch_status(batch_id, max_age=0),
+                                            [batch_id for batch_id, _ in polled])
+                    
+                    ready = []
+                    for (batch_id, i), status_info in zip(polled, statuses):
                         if "error" in status_info:
-                            print(f"Error checking chunk {i+1} status: {status_info['error']}")
-                            completed_batches[batch_id] = None
+                            logger.error("Error checking chunk %s status: %s", i+1, status_info['error'])
+                            chunk_failed(i)
+                            del pending[batch_id]
                             continue
                         
                         status = status_info["status"]
                         
                         if status == "completed":
-                            chunk_results = self._retrieve_batch_results(batch_id, status_info)
-                            completed_batches[batch_id] = chunk_results
-                            print(f"Chunk {i+1} completed: {len(chunk_results) if chunk_results else 0} results")
+                            ready.append((i, batch_id, status_info))
+                            del pending[batch_id]
                         
                         elif status == "failed":
-                            print(f"Chunk {i+1} failed!")
+                            logger.error("Chunk %s failed!", i+1)
                             self._handle_batch_errors(batch_id, status_info)
-                            completed_batches[batch_id] = None
+                            chunk_failed(i)
+                            del pending[batch_id]
                         
                         elif status in ["expired", "cancelled"]:
-                            print(f"Chunk {i+1} {status}!")
-                            completed_batches[batch_id] = None
-                
-                # Show overall progress
-                completed_count = len(completed_batches)
-                if completed_count < len(batch_ids):
-                    print(f"Progress: {completed_count}/{len(batch_ids)} batches completed")
-                    time.sleep(30)  # Check every 30 seconds
+                            logger.warning("Chunk %s %s!", i+1, status)
+                            chunk_failed(i)
+                            del pending[batch_id]
+                        
+                        else:
+                            if last_statuses.get(batch_id) == status:
+                                polls_in_status[batch_id] += 1
+                            else:
+                                last_statuses[batch_id] = status
+                                polls_in_status[batch_id] = 0
+                    
+                    # Chunks that finished in the same pass download their results in parallel
+                    downloads = executor.map(lambda item: self._retrieve_batch_results(item[1], item[2]), ready)
+                    for (i, batch_id, _), results in zip(ready, downloads):
+                        chunk_results[i] = results
+                        if run_dir and results:
+                            self._write_chunk_checkpoint(run_dir, i, chunk_ids[i], results)
+                        logger.info("Chunk %s completed: %s results", i+1, len(results) if results else 0)
+                    
+                    # Show overall progress
+                    if pending:
+                        logger.info("Progress: %s/%s batches completed", len(batch_ids) - len(pending), len(batch_ids))
+                        # Back off on the least-stale pending chunk so a status change is followed up quickly
+                        time.sleep(_next_poll_interval(min(
+                            polls_in_status.get(batch_id, 0) for batch_id in pending
+                        )))
             
             # Combine results in order
-            for batch_id in batch_ids:
-                chunk_results = completed_batches.get(batch_id)
-                if chunk_results:
-                    all_results.extend(chunk_results)
+            for i in range(len(chunks)):
+                results = chunk_results.get(i)
+                if results:
+                    if run_dir and chunk_ids[i] != current_ids(i):
+                        # Relabel results submitted by an earlier attempt with this call's IDs
+                        relabel = dict(zip(chunk_ids[i], current_ids(i)))
+                        for result in results:
+                            result["custom_id"] = relabel.get(result.get("custom_id"), result.get("custom_id"))
+                    all_results.extend(results)
                 else:
-                    print(f"Warning: Batch {batch_id} failed, some results may be missing")
+                    logger.warning("Warning: Batch %s failed, some results may be missing", batch_ids.get(i, f"chunk {i + 1}"))
             
-            print(f"\nAll batches completed. Total results: {len(all_results)}")
+            logger.info("\nAll batches completed. Total results: %s", len(all_results))
             
             # Check if any batches failed
-            failed_batches = [bid for bid, results in completed_batches.items() if results is None]
-            if failed_batches:
-                print(f"Warning: {len(failed_batches)} out of {len(batch_ids)} batches failed")
-                return None if len(failed_batches) == len(batch_ids) else all_results
+            if failed_chunks:
+                logger.warning("Warning: %s out of %s batches failed", len(failed_chunks), len(chunks))
+                return None if len(failed_chunks) == len(chunks) else all_results
             
+            if run_dir:
+                shutil.rmtree(run_dir, ignore_errors=True)
             return all_results
             
         finally:
             # Clean up chunk files
-            for chunk_file in chunk_files:
-                if os.path.exists(chunk_file):
-                    os.unlink(chunk_file)
+            _remove_files_in_background(list(chunk_files.values()))
+
+    @staticmethod
+    def _load_chunk_checkpoint(run_dir: str, chunk_idx: int):
+        """
+        Read a chunk checkpoint as (custom_ids, results).
+
+        results is None when the chunk was submitted but not yet retrieved; the whole
+        checkpoint is None when the chunk was never submitted (or its files are unreadable).
+        """
+        base = os.path.join(run_dir, f"chunk_{chunk_idx}")
+        try:
+            with open(base + ".ids.json", 'rb') as f:
+                ids = _json_loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable checkpoint for chunk %s: %s", chunk_idx + 1, e)
+            return None
+        
+        try:
+            with open(base + ".jsonl", 'rb') as f:
+                return ids, [_json_loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return ids, None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable results checkpoint for chunk %s: %s", chunk_idx + 1, e)
+            return ids, None
+
+    @staticmethod
+    def _write_chunk_checkpoint(run_dir: str, chunk_idx: int, ids: List[str],
+                                results: Optional[List[Dict[str, Any]]] = None) -> None:
+        """Record a chunk's submitted custom_ids, or its retrieved results (write-then-replace)."""
+        base = os.path.join(run_dir, f"chunk_{chunk_idx}")
+        if results is None:
+            path, data = base + ".ids.json", [_json_dumps_bytes(ids)]
+        else:
+            path, data = base + ".jsonl", map(_jsonl_line, results)
+        try:
+            with open(path + ".tmp", 'wb') as f:
+                f.writelines(data)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            logger.warning("Could not write checkpoint for chunk %s: %s", chunk_idx + 1, e)
+
+    @staticmethod
+    def _remove_chunk_checkpoint(run_dir: str, chunk_idx: int) -> None:
+        base = os.path.join(run_dir, f"chunk_{chunk_idx}")
+        _remove_files([base + ".ids.json", base + ".jsonl"])
+
+    @staticmethod
+    def _has_chunk_results(run_dir: str, newer_than: float) -> bool:
+        """Whether run_dir holds retrieved chunk results written after newer_than."""
+        try:
+            with os.scandir(run_dir) as entries:
+                return any(entry.name.endswith(".jsonl") and entry.stat().st_mtime > newer_than
+                           for entry in entries)
+        except OSError:
+            return False
     
-    def check_batch_status(self, batch_id: str) -> Dict[str, Any]:
+    def check_batch_status(self, batch_id: str,
+                           max_age: float = STATUS_CACHE_TTL_SECONDS) -> Dict[str, Any]:
         """
         Check the status of a batch job.
         
         Args:
             batch_id: ID of the batch job
+            max_age: Reuse a status retrieved at most this many seconds ago; terminal
+                statuses are reused regardless. Polling loops pass 0.
             
         Returns:
             Dictionary containing batch status information
         """
+        cached = self._status_cache.get(batch_id)
+        if cached and (cached[1]["status"] in TERMINAL_BATCH_STATUSES
+                       or time.monotonic() - cached[0] < max_age):
+            return cached[1]
+
         try:
             batch_job = self.client.batches.retrieve(batch_id)
             
@@ -595,13 +1130,18 @@ class BatchProcessor:
                 
             if hasattr(batch_job, 'error_file_id') and batch_job.error_file_id:
                 status_info["error_file_id"] = batch_job.error_file_id
-                
+            
+            self._status_cache[batch_id] = (time.monotonic(), status_info)
             return status_info
             
         except Exception as e:
-            print(f" Failed to check batch status: {str(e)}")
+            logger.error(" Failed to check batch status: %s", e)
             return {"error": str(e)}
     
+    def invalidate_status(self, batch_id: str) -> None:
+        """Drop any cached status for a batch so the next check retrieves it again."""
+        self._status_cache.pop(batch_id, None)
+    
     def wait_for_completion(self, batch_id: str, 
                           max_wait_hours: int = 24,
                           check_interval_minutes: int = 5) -> Optional[List[Dict[str, Any]]]:
@@ -611,100 +1151,119 @@ class BatchProcessor:
         Args:
             batch_id: ID of the batch job
             max_wait_hours: Maximum hours to wait for completion
-            check_interval_minutes: Minutes between status checks
+            check_interval_minutes: Longest gap between status checks (polling starts
+                at ~5 s and backs off to this) and the interval for progress updates
             
         Returns:
             List of batch results or None if failed/timeout
         """
-        start_time = datetime.now()
-        max_wait_time = timedelta(hours=max_wait_hours)
-        check_interval = timedelta(minutes=check_interval_minutes)
+        # Elapsed time is measured on the monotonic clock (cheap, immune to clock changes)
+        start_time = time.monotonic()
+        max_wait_seconds = max_wait_hours * 3600
+        check_interval_seconds = check_interval_minutes * 60
         
-        print(f" Waiting for batch completion (ID: {batch_id})")
-        print(f"   Max wait time: {max_wait_hours} hours")
-        print(f"   Check interval: {check_interval_minutes} minutes")
+        logger.info(" Waiting for batch completion (ID: %s)", batch_id)
+        logger.info("   Max wait time: %s hours", max_wait_hours)
+        logger.info("   Check interval: backing off to %s minutes", check_interval_minutes)
         
-        last_check = datetime.now()
+        last_check = start_time
+        last_status = None
+        polls_in_status = 0
         
-        while datetime.now() - start_time < max_wait_time:
+        while time.monotonic() - start_time < max_wait_seconds:
             # Check status
-            status_info = self.check_batch_status(batch_id)
+            status_info = self.check_batch_status(batch_id, max_age=0)
             
             if "error" in status_info:
-                print(f" Error checking batch status: {status_info['error']}")
+                logger.error(" Error checking batch status: %s", status_info['error'])
                 return None
             
             status = status_info["status"]
-            request_counts = status_info.get("request_counts", {})
-            
-            # Print progress update
-            if datetime.now() - last_check >= check_interval:
-                print(f" Batch Status: {status}")
-                if request_counts:
-                    total = getattr(request_counts, "total", 0)
-                    completed = getattr(request_counts, "completed", 0)
-                    failed = getattr(request_counts, "failed", 0)
-                    print(f"   Progress: {completed}/{total} completed, {failed} failed")
-                last_check = datetime.now()
+            rc = status_info.get("request_counts")
+            total, completed, failed = (
+                (getattr(rc, "total", 0), getattr(rc, "completed", 0), getattr(rc, "failed", 0))
+                if rc else (0, 0, 0)
+            )
+            
+            # Print progress update (skipped entirely when INFO is silenced)
+            if logger.isEnabledFor(logging.INFO) and time.monotonic() - last_check >= check_interval_seconds:
+                logger.info(" Batch Status: %s", status)
+                if total:
+                    logger.info("   Progress: %s/%s completed, %s failed", completed, total, failed)
+                last_check = time.monotonic()
             
             # Check if completed
             if status == "completed":
-                print(f" Batch completed successfully!")
+                logger.info(" Batch completed successfully!")
                 return self._retrieve_batch_results(batch_id, status_info)
             
             elif status == "failed":
-                print(f" Batch failed!")
+                logger.error(" Batch failed!")
                 self._handle_batch_errors(batch_id, status_info)
                 return None
             
             elif status in ["expired", "cancelled"]:
-                print(f" Batch {status}!")
+                logger.warning(" Batch %s!", status)
                 return None
             
-            # Wait before next check
-            time.sleep(60)  # Check every minute, but only print updates per interval
+            # Wait before next check: back off while the status holds, start over when it changes
+            if status == last_status:
+                polls_in_status += 1
+            else:
+                last_status = status
+                polls_in_status = 0
+            time.sleep(_next_poll_interval(polls_in_status, max_interval=check_interval_seconds))
         
-        print(f" Timeout waiting for batch completion after {max_wait_hours} hours")
+        logger.error(" Timeout waiting for batch completion after %s hours", max_wait_hours)
         return None
     
+    def iter_batch_results(self, output_file_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the parsed result lines of a batch output file as they download.
+
+        The file is streamed and each JSONL line parsed as soon as it is complete, so
+        the raw payload is never held in memory; pair with process_batch_results to
+        handle results during the download.
+        """
+        with self.client.files.with_streaming_response.content(output_file_id) as response:
+            pending = b''
+            for chunk in response.iter_bytes():
+                *lines, pending = (pending + chunk).split(b'\n')
+                for line in lines:
+                    if line.strip():
+                        yield _json_loads(line)
+            if pending.strip():
+                yield _json_loads(pending)
+
     def _retrieve_batch_results(self, batch_id: str, 
                               status_info: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Retrieve and parse batch results from completed job."""
         try:
             output_file_id = status_info.get("output_file_id")
             if not output_file_id:
-                print(f" No output file ID found for batch {batch_id}")
+                logger.error(" No output file ID found for batch %s", batch_id)
                 return []
             
-            print(f" Downloading batch results...")
-            
-            # Download the results file
-            result_content = self.client.files.content(output_file_id)
-            
-            # Parse JSONL results
-            results = []
-            for line in result_content.text.strip().split('\n'):
-                if line.strip():
-                    result = json.loads(line)
-                    results.append(result)
-            
-            print(f" Retrieved {len(results)} batch results")
+            logger.info(" Downloading batch results...")
+            results = list(self.iter_batch_results(output_file_id))
+            logger.info(" Retrieved %s batch results", len(results))
 
-            # Clean up temporary file if it exists
-            if batch_id in self.batch_jobs:
-                temp_file_path = self.batch_jobs[batch_id].get("temp_file_path")
-                if temp_file_path and os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            # Clean up the local input copy that state files from older runs may still list
+            with self._state_lock:
+                if batch_id in self.batch_jobs:
+                    temp_file_path = self.batch_jobs[batch_id].get("temp_file_path")
+                    if temp_file_path and os.path.exists(temp_file_path):
+                        os.unlink(temp_file_path)
 
-                # Remove completed batch from state
-                del self.batch_jobs[batch_id]
-                self._save_state()
-                print(f" Batch {batch_id} removed from state (completed)")
+                    # Remove completed batch from state
+                    del self.batch_jobs[batch_id]
+                    self._save_state()
+                    logger.info(" Batch %s removed from state (completed)", batch_id)
 
             return results
             
         except Exception as e:
-            print(f" Failed to retrieve batch results: {str(e)}")
+            logger.error(" Failed to retrieve batch results: %s", e)
             return []
     
     def _handle_batch_errors(self, batch_id: str, status_info: Dict[str, Any]):
@@ -713,21 +1272,22 @@ class BatchProcessor:
             error_file_id = status_info.get("error_file_id")
             if error_file_id:
                 error_content = self.client.files.content(error_file_id)
-                print(f" Batch Error Details:")
-                print(error_content.text)
+                logger.info(" Batch Error Details:")
+                logger.error("%s", error_content.text)
             else:
-                print(f" Batch failed but no error file available")
+                logger.warning(" Batch failed but no error file available")
                 
         except Exception as e:
-            print(f" Failed to retrieve error details: {str(e)}")
+            logger.error(" Failed to retrieve error details: %s", e)
     
-    def process_batch_results(self, results: List[Dict[str, Any]], 
+    def process_batch_results(self, results: Iterable[Union[Dict[str, Any], bytes]], 
                             custom_id_mapping: Dict[str, Any]) -> Dict[str, Any]:
         """
         Process batch results and map them back to original requests.
         
         Args:
-            results: Raw batch results from OpenAI
+            results: Raw batch results from OpenAI: a list, or any iterable such as
+                iter_batch_results(); unparsed JSONL lines (bytes) are parsed as they come
             custom_id_mapping: Mapping of custom IDs to original data
             
         Returns:
@@ -740,71 +1300,68 @@ class BatchProcessor:
         successful_results = 0
         failed_results = 0
 
+        # Bound once so the per-record work below avoids repeated method lookups
+        _get = dict.get
+        store_result = processed_results.__setitem__
+
         for result in results:
-            custom_id = result.get("custom_id")
-
-            if "response" in result and result["response"]:
-                # Successful result
-                response = result["response"]
-                body = response.get("body", {})
-
-                if "choices" in body and body["choices"]:
-                    # Extract the content
-                    content = body["choices"][0]["message"]["content"]
-                    usage = body.get("usage", {})
-                    prompt_details = usage.get("prompt_tokens_details")
-                    cached_tokens = prompt_details.get("cached_tokens", 0) if isinstance(prompt_details, dict) else 0
-
-                    processed_results[custom_id] = {
-                        "success": True,
-                        "content": content,
-                        "usage": usage,
-                        "cached_tokens": cached_tokens,
-                        "custom_id": custom_id
-                    }
+            if isinstance(result, (bytes, str)):
+                if not result.strip():
+                    continue
+                result = _json_loads(result)
+            custom_id = _get(result, "custom_id")
 
-                    # Track token usage
-                    total_prompt_tokens += usage.get("prompt_tokens", 0)
-                    total_completion_tokens += usage.get("completion_tokens", 0)
-                    total_cached_tokens += cached_tokens
-                    successful_results += 1
-                    
-                else:
+            try:
+                # Fast path: nearly every record in a healthy batch is a success
+                body = result["response"]["body"]
+                content = body["choices"][0]["message"]["content"]
+            except (KeyError, TypeError, IndexError):
+                if _get(result, "response"):
                     # Response structure issue
-                    processed_results[custom_id] = {
-                        "success": False,
-                        "error": "Invalid response structure",
-                        "custom_id": custom_id
-                    }
-                    failed_results += 1
-            
-            elif "error" in result:
-                # Failed result
-                error_info = result["error"]
-                processed_results[custom_id] = {
-                    "success": False,
-                    "error": error_info,
-                    "custom_id": custom_id
-                }
-                failed_results += 1
-            
-            else:
-                # Unknown result format
-                processed_results[custom_id] = {
+                    error = "Invalid response structure"
+                elif "error" in result:
+                    # Failed result
+                    error = result["error"]
+                else:
+                    error = "Unknown result format"
+                store_result(custom_id, {
                     "success": False,
-                    "error": "Unknown result format",
+                    "error": error,
                     "custom_id": custom_id
-                }
+                })
                 failed_results += 1
+                continue
+
+            usage = _get(body, "usage") or {}
+            try:
+                cached_tokens = usage["prompt_tokens_details"]["cached_tokens"] or 0
+            except (KeyError, TypeError):
+                cached_tokens = 0
+
+            store_result(custom_id, {
+                "success": True,
+                "content": content,
+                "usage": usage,
+                "cached_tokens": cached_tokens,
+                "custom_id": custom_id
+            })
+
+            # Track token usage
+            total_prompt_tokens += _get(usage, "prompt_tokens", 0)
+            total_completion_tokens += _get(usage, "completion_tokens", 0)
+            total_cached_tokens += cached_tokens
+            successful_results += 1
         
         # Print summary
-        print(f" Batch Processing Summary:")
-        print(f"   Successful: {successful_results}")
-        print(f"   Failed: {failed_results}")
-        print(f"   Total prompt tokens: {total_prompt_tokens:,}")
-        print(f"   Total completion tokens: {total_completion_tokens:,}")
+        logger.info(" Batch Processing Summary:")
+        logger.info("   Successful: %s", successful_results)
+        logger.info("   Failed: %s", failed_results)
+        logger.info("   Total prompt tokens: %s", format(total_prompt_tokens, ","))
+        logger.info("   Total completion tokens: %s", format(total_completion_tokens, ","))
+        cache_hit_rate = total_cached_tokens / total_prompt_tokens if total_prompt_tokens else 0
         if total_cached_tokens > 0:
-            print(f"   Total cached tokens: {total_cached_tokens:,}")
+            logger.info("   Total cached tokens: %s (%.1f%% of prompt tokens)",
+                        format(total_cached_tokens, ","), cache_hit_rate * 100)
 
         return {
             "results": processed_results,
@@ -813,6 +1370,7 @@ class BatchProcessor:
                 "failed": failed_results,
                 "total_prompt_tokens": total_prompt_tokens,
                 "total_completion_tokens": total_completion_tokens,
-                "total_cached_tokens": total_cached_tokens
+                "total_cached_tokens": total_cached_tokens,
+                "cache_hit_rate": cache_hit_rate
             }
         }
\ No newline at end of file
@@ -11,7 +11,8 @@ MODEL_CONFIGS = {
         "model": "gpt-4.1-mini",
         "max_tokens": 4000,
         "temperature": 0.0,
-        "batch_threshold": 10  # Use batch processing if more than this many items
+        "batch_threshold": 10,  # Use batch processing if more than this many items
+        "use_result_cache": True  # False (or OPENAI_BATCH_RESULT_CACHE=0) always submits a fresh batch
     },
     "step3_ai_analysis": {
         "model": "gpt-4.1",
@@ -101,6 +101,39 @@ def update_record_step15_cleaning(json_path: str, barcode: str,
         data["records"][barcode]["updated_at"] = datetime.now().isoformat()
         save_workflow_json(json_path, data)
 
+def update_records_step15_cleaning_bulk(json_path: str, updates: List[Dict[str, Any]]):
+    """
+    Update JSON with Step 1.5 metadata cleaning results for many records at once.
+
+    Each update holds "barcode", "changes_made" and "upc_extracted", matching the
+    arguments of update_record_step15_cleaning. The file is read and written once.
+    """
+    if not updates:
+        return
+    
+    data = load_workflow_json(json_path)
+    records = data["records"]
+    updated = False
+    
+    for update in updates:
+        barcode = update["barcode"]
+        if barcode not in records:
+            continue
+        
+        changes_made = update["changes_made"]
+        now = datetime.now().isoformat()
+        records[barcode]["step1_5_metadata_cleaning"] = {
+            "numbers_edited": changes_made.get("numbers_edited", False),
+            "date_edited": changes_made.get("date_edited", False),
+            "valid_numbers_extracted": update.get("upc_extracted"),
+            "completed_at": now
+        }
+        records[barcode]["updated_at"] = now
+        updated = True
+    
+    if updated:
+        save_workflow_json(json_path, data)
+
 def update_record_step2(json_path: str, barcode: str, queries_attempted: int, 
                        total_records_found: int):
     """Update JSON with Step 2 OCLC search results."""
@@ -123,7 +123,8 @@ def get_model_info(model_name):
     
     return MODEL_PRICING[model_name]
 
-def estimate_cost(model_name, estimated_prompt_tokens, estimated_completion_tokens, is_batch=False):
+def estimate_cost(model_name, estimated_prompt_tokens, estimated_completion_tokens, is_batch=False,
+                  cached_prompt_tokens=0):
     """
     Estimate cost before making API calls.
     
@@ -132,12 +133,15 @@ def estimate_cost(model_name, estimated_prompt_tokens, estimated_completion_toke
         estimated_prompt_tokens (int): Estimated input tokens
         estimated_completion_tokens (int): Estimated output tokens
         is_batch (bool): Whether this will be a batch request
+        cached_prompt_tokens (int): Expected cached subset of the prompt tokens
     
     Returns:
         dict: Cost breakdown
     """
-    regular_cost = calculate_cost(model_name, estimated_prompt_tokens, estimated_completion_tokens, is_batch=False)
-    batch_cost = calculate_cost(model_name, estimated_prompt_tokens, estimated_completion_tokens, is_batch=True)
+    regular_cost = calculate_cost(model_name, estimated_prompt_tokens, estimated_completion_tokens,
+                                  is_batch=False, cached_tokens=cached_prompt_tokens)
+    batch_cost = calculate_cost(model_name, estimated_prompt_tokens, estimated_completion_tokens,
+                                is_batch=True, cached_tokens=cached_prompt_tokens)
     
     return {
         "regular_cost": regular_cost,
@@ -16,74 +16,78 @@ from cd_workflow_config import get_file_path_config
 # Configuration - easily changeable
 DIGITS_COUNT = 15  # Change this to 10, 12, etc. as needed
 VALID_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+IMAGE_SUFFIXES = tuple(VALID_EXTENSIONS)
 LETTERS = 'abcdefghijklmnopqrstuvwxyz'
 
-def remove_spaces_from_filenames(directory_path):
-    """Remove spaces from all image filenames and return list of modified files."""
-    directory = Path(directory_path)
+# Exact number of digits + single lowercase letter + valid extension (any case)
+_FILENAME_RE = re.compile(rf'\d{{{DIGITS_COUNT}}}[a-z]\.(?i:png|jpg|jpeg)')
+
+def scan_and_collect(directory_path):
+    """
+    Remove spaces from filenames and collect image files in one directory scan.
+
+    Returns:
+        tuple: (list of (old_name, new_name) renames, list of image filenames)
+    """
     modified_files = []
+    image_files = []
     
-    # Get all files (not just valid extensions, in case there are space issues)
-    all_files = [f for f in directory.iterdir() if f.is_file()]
+    # scandir reuses the directory entry's file type instead of a stat() per file
+    with os.scandir(directory_path) as entries:
+        filenames = [entry.name for entry in entries if entry.is_file()]
     
-    for file_path in all_files:
-        filename = file_path.name
-        
-        # Check if filename contains spaces
+    for filename in filenames:
+        # Remove spaces from every file (not just valid extensions)
         if ' ' in filename:
-            # Create new filename without spaces
             new_filename = filename.replace(' ', '')
-            new_file_path = file_path.parent / new_filename
             
             try:
                 # Rename the file
-                file_path.rename(new_file_path)
+                os.rename(os.path.join(directory_path, filename),
+                          os.path.join(directory_path, new_filename))
                 modified_files.append((filename, new_filename))
+                filename = new_filename
             except Exception as e:
                 print(f"Error renaming {filename}: {e}")
+        
+        if filename.lower().endswith(IMAGE_SUFFIXES):
+            image_files.append(filename)
     
-    return modified_files
+    return modified_files, image_files
 
 def is_valid_format(filename):
     """Check if filename matches the expected format: {DIGITS_COUNT}digits + letter + extension."""
-    name_without_ext = os.path.splitext(filename)[0]
-    extension = os.path.splitext(filename)[1].lower()
-    
-    # Check if extension is valid
-    if extension not in VALID_EXTENSIONS:
-        return False
-    
-    # Check if name matches pattern: exact number of digits + single letter
-    pattern = f'^\\d{{{DIGITS_COUNT}}}[a-z]$'
-    return bool(re.match(pattern, name_without_ext))
+    return bool(_FILENAME_RE.fullmatch(filename))
 
 def create_validation_log(results_folder_path, valid_files, invalid_files):
-    """Create a log file with validation results."""
+    """Create a log file with validation results. Expects already-sorted filename lists."""
     log_file_path = os.path.join(results_folder_path, "logs", "file_validation_log.txt")
     
     # Ensure logs directory exists
     os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
     
+    # Build the whole log in memory and write it in one call
+    parts = [
+        "File Validation Log\n",
+        f"Created at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        "="*60 + "\n\n",
+        "SUMMARY:\n",
+        f"Valid files: {len(valid_files)}\n",
+        f"Invalid files: {len(invalid_files)}\n",
+    ]
+    
+    if valid_files:
+        parts.append(f"VALID FILES ({len(valid_files)}):\n")
+        parts.extend(f"  {filename}\n" for filename in valid_files)
+        parts.append("\n")
+    
+    if invalid_files:
+        parts.append(f"INVALID FILES ({len(invalid_files)}):\n")
+        parts.extend(f"  {filename}\n" for filename in invalid_files)
+        parts.append("\n")
+    
     with open(log_file_path, "w") as log_file:
-        log_file.write(f"File Validation Log\n")
-        log_file.write(f"Created at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log_file.write("="*60 + "\n\n")
-        
-        log_file.write(f"SUMMARY:\n")
-        log_file.write(f"Valid files: {len(valid_files)}\n")
-        log_file.write(f"Invalid files: {len(invalid_files)}\n")
-        
-        if valid_files:
-            log_file.write(f"VALID FILES ({len(valid_files)}):\n")
-            for filename in sorted(valid_files):
-                log_file.write(f"  {filename}\n")
-            log_file.write("\n")
-        
-        if invalid_files:
-            log_file.write(f"INVALID FILES ({len(invalid_files)}):\n")
-            for filename in sorted(invalid_files):
-                log_file.write(f"  {filename}\n")
-            log_file.write("\n")
+        log_file.write("".join(parts))
     
     return log_file_path
 
@@ -99,8 +103,8 @@ def main():
         print(f"Error: Directory {directory_path} does not exist")
         return False
     
-    # First, remove spaces from filenames
-    modified_files = remove_spaces_from_filenames(directory_path)
+    # Remove spaces from filenames and gather image files in a single pass
+    modified_files, image_files = scan_and_collect(directory_path)
     
     if modified_files:
         print(f"\nREMOVED SPACES FROM {len(modified_files)} FILE(S):")
@@ -108,12 +112,6 @@ def main():
             print(f"  '{old_name}' → '{new_name}'")
         print()
     
-    # Get all image files (after space removal)
-    image_files = []
-    for ext in VALID_EXTENSIONS:
-        image_files.extend(directory.glob(f'*{ext}'))
-        image_files.extend(directory.glob(f'*{ext.upper()}'))
-    
     if not image_files:
         print("No image files found in directory")
         return False
@@ -126,27 +124,26 @@ def main():
     valid_files = []
     invalid_files = []
     
-    for file_path in image_files:
-        if is_valid_format(file_path.name):
-            valid_files.append(file_path.name)
+    for filename in image_files:
+        if is_valid_format(filename):
+            valid_files.append(filename)
         else:
-            invalid_files.append(file_path.name)
+            invalid_files.append(filename)
+    
+    # Show results (sorted once, in place)
+    valid_files.sort()
+    invalid_files.sort()
     
-    # Show results
     print(f"\nVALID FILES ({len(valid_files)}):")
     if valid_files:
-        valid_files.sort()
-        for filename in valid_files:
-            print(f"  {filename}")
+        sys.stdout.write('  ' + '\n  '.join(valid_files) + '\n')
     else:
         print("  None")
     
     print(f"\nINVALID FILES ({len(invalid_files)}):")
     has_issues = len(invalid_files) > 0
     if invalid_files:
-        invalid_files.sort()
-        for filename in invalid_files:
-            print(f"  {filename}")
+        sys.stdout.write('  ' + '\n  '.join(invalid_files) + '\n')
         
         print("\n" + "=" * 70)
         print("BEFORE STARTING THE WORKFLOW:")
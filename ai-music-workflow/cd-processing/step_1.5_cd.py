@@ -1,39 +1,56 @@
 # Clean up publication numbers and dates
 import re
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import openpyxl
 
 #custom modules
-from json_workflow import log_error, log_processing_metrics
+from json_workflow import log_error, log_processing_metrics, update_records_step15_cleaning_bulk
 from shared_utilities import find_latest_results_folder, get_workflow_json_path
 from cd_workflow_config import get_file_path_config
 
+# Patterns used on every spreadsheet row, compiled once at import
+_HAS_LETTER_RE = re.compile(r'[A-Za-z]')
+_SPACE_DASH_RE = re.compile(r'[\s\-]+')
+_ADDRESS_RE = re.compile(r'road|street|ave|avenue|blvd|boulevard|drive|lane|way|place|court', re.IGNORECASE)
+_STATE_ZIP_RE = re.compile(r'\b[A-Z]{2}\s+\d{5}')
+_NUMBERS_SECTION_RE = re.compile(r'(Publishers:.*?Numbers:)\s*(.*?)(\n|$)', re.DOTALL | re.MULTILINE)
+_DATES_SECTION_RE = re.compile(r'(Dates:.*?publicationDate:)\s*(.*?)(?:\n|$)', re.DOTALL | re.MULTILINE)
+_YEAR_RE = re.compile(r'^[0-9]{4}$')
+
+# Fixed characters to delete; str.translate avoids the regex engine entirely
+_STRIP_BRACKETS = str.maketrans('', '', '[]')
+_STRIP_COPYRIGHT = str.maketrans('', '', '©℗')
+
+# Below this many rows, worker startup costs more than the cleaning itself
+PARALLEL_CLEANING_MIN_ROWS = 500
+
 def clean_number(number_text):
     """Clean numeric codes by removing spaces/dashes, but preserve spaces in alphanumeric catalog numbers."""
     # If it contains letters, it's likely a catalog number - remove dashes but keep structure
-    if re.search(r'[A-Za-z]', number_text):
+    if _HAS_LETTER_RE.search(number_text):
         return number_text.strip().replace('-', '')
     # If it's all digits/spaces/dashes, remove spaces and dashes
     else:
-        return re.sub(r'[\s\-]+', '', number_text)
+        return _SPACE_DASH_RE.sub('', number_text)
 
 def is_valid_upc(number):
     """Check if a number is valid (UPC/EAN/ISBN/catalog) but exclude UT Libraries barcodes and other irrelevant bits of information."""
-    # Remove spaces only for digit-only validation
-    digits_only = re.sub(r'\s', '', number)
+    # Remove whitespace only for digit-only validation (split() drops the same characters as \s)
+    digits_only = ''.join(number.split())
     
     # Exclude UT Libraries barcode stickers (10 digits or 15 digits starting with 05917)
     if digits_only.isdigit() and (len(digits_only) == 10 or (len(digits_only) == 15 and digits_only.startswith('05917'))):
         return False
     
     # Accept catalog numbers (contain letters) with reasonable constraints
-    if re.search(r'[A-Za-z]', number):
+    if _HAS_LETTER_RE.search(number):
         # Exclude obvious addresses (contain "Road", "Street", "Ave", etc.)
-        address_indicators = ['road', 'street', 'ave', 'avenue', 'blvd', 'boulevard', 'drive', 'lane', 'way', 'place', 'court']
-        if any(indicator in number.lower() for indicator in address_indicators):
+        if _ADDRESS_RE.search(number):
             return False
         # Exclude if it contains state abbreviations with ZIP codes (like "IL 60618")
-        if re.search(r'\b[A-Z]{2}\s+\d{5}', number):
+        if _STATE_ZIP_RE.search(number):
             return False
         # Reasonable length for catalog numbers (3-20 characters)
         return 3 <= len(number.strip()) <= 20
@@ -44,23 +61,14 @@ def is_valid_upc(number):
     
     return False
 
-def extract_upc_from_metadata(metadata_text):
-    """Extract and validate UPC numbers from the metadata text."""
-    # Find the Numbers line in the Publishers section
-    numbers_pattern = r'Publishers:.*?Numbers:\s*(.*?)(?:\n|$)'
-    numbers_match = re.search(numbers_pattern, metadata_text, re.DOTALL | re.MULTILINE)
-    
-    if not numbers_match:
-        return None, "No 'Numbers' field found"
-    
-    numbers_text = numbers_match.group(1).strip()
-    
+def _extract_upc_from_numbers(numbers_text):
+    """Validate the comma-separated entries of a Numbers field value."""
     # Handle "Not visible" case
     if numbers_text.lower() == "not visible":
         return None, "Numbers field marked as 'Not visible'"
     
     # Remove square brackets that might wrap the numbers
-    numbers_text = re.sub(r'[\[\]]', '', numbers_text)
+    numbers_text = numbers_text.translate(_STRIP_BRACKETS)
     
     # Split multiple numbers by comma and process each
     number_parts = [part.strip() for part in numbers_text.split(',')]
@@ -77,61 +85,119 @@ def extract_upc_from_metadata(metadata_text):
     else:
         return None, f"No valid numbers found in '{numbers_text}'"
 
+def extract_upc_from_metadata(metadata_text):
+    """Extract and validate UPC numbers from the metadata text."""
+    # Find the Numbers line in the Publishers section
+    numbers_match = _NUMBERS_SECTION_RE.search(metadata_text)
+    
+    if not numbers_match:
+        return None, "No 'Numbers' field found"
+    
+    return _extract_upc_from_numbers(numbers_match.group(2).strip())
+
+def _clean_date_value(date_value):
+    """Return the replacement for a publicationDate value, or None to leave it unchanged."""
+    # Check if the date is already "Not visible"
+    if date_value.lower() == "not visible":
+        return None
+    
+    # Strip copyright and phonogram symbols
+    cleaned_date = date_value.translate(_STRIP_COPYRIGHT).strip()
+    
+    # Keep a plain 4-digit year, replacing it only if symbols were removed
+    if _YEAR_RE.match(cleaned_date):
+        return cleaned_date if cleaned_date != date_value else None
+    
+    # Otherwise, it's a complex date with month/day components
+    return "Not visible"
+
+def _substitute_dates(metadata_text):
+    """Rewrite every Dates section using the value cleaned from the first one."""
+    replacement = None
+    date_checked = False
+    
+    def replace(match):
+        nonlocal replacement, date_checked
+        if not date_checked:
+            replacement = _clean_date_value(match.group(2).strip())
+            date_checked = True
+        if replacement is None:
+            return match.group(0)
+        return f"{match.group(1)} {replacement}\n"
+    
+    return _DATES_SECTION_RE.sub(replace, metadata_text)
+
 def clean_dates_in_metadata(metadata_text):
     """
     Replace dates that include month or day components with 'Not visible'.
     Keep standalone years (e.g., '2002') after stripping copyright symbols.
     """
-    # First, find the Dates section
-    dates_section_pattern = r'(Dates:.*?publicationDate:)\s*(.*?)(?:\n|$)'
-    dates_match = re.search(dates_section_pattern, metadata_text, re.DOTALL | re.MULTILINE)
+    return _substitute_dates(metadata_text)
+
+def clean_metadata_text(metadata_text):
+    """
+    Clean the dates and numbers sections of a single metadata entry.
+
+    Each section is found and rewritten in one regex pass, with the UPC
+    extracted from the same match that gets replaced.
+
+    Returns:
+        tuple: (updated_text, date_changed, upc, upc_changed)
+    """
+    # Plain substring checks are far cheaper than a DOTALL search that cannot match
+    if 'Dates:' in metadata_text:
+        updated_metadata = _substitute_dates(metadata_text)
+    else:
+        updated_metadata = metadata_text
+    date_changed = updated_metadata != metadata_text
     
-    if not dates_match:
-        return metadata_text  # No dates section found
+    upc = None
+    if 'Numbers:' not in updated_metadata:
+        return updated_metadata, date_changed, upc, False
     
-    date_value = dates_match.group(2).strip()
+    upc_found = False
     
-    # Check if the date is already "Not visible"
-    if date_value.lower() == "not visible":
-        return metadata_text
+    def replace_numbers(match):
+        nonlocal upc, upc_found
+        if not upc_found:
+            upc, _ = _extract_upc_from_numbers(match.group(2).strip())
+            upc_found = True
+        return f"{match.group(1)} {upc if upc else 'Not visible'}{match.group(3)}"
     
-    # Strip copyright and phonogram symbols
-    cleaned_date = re.sub(r'[©℗]', '', date_value).strip()
-    
-    # Check if the cleaned date is just a 4-digit year (which we want to keep)
-    if re.match(r'^[0-9]{4}$', cleaned_date):
-        # Replace with cleaned year if symbols were removed
-        if cleaned_date != date_value:
-            cleaned_text = re.sub(
-                dates_section_pattern,
-                r'\1 ' + cleaned_date + r'\n',
-                metadata_text,
-                flags=re.DOTALL | re.MULTILINE
-            )
-            return cleaned_text
-        else:
-            return metadata_text  # Keep as-is if no symbols to remove
-    
-    # Otherwise, it's a complex date with month/day components - replace with "Not visible"
-    cleaned_text = re.sub(
-        dates_section_pattern,
-        r'\1 Not visible\n',
-        metadata_text,
-        flags=re.DOTALL | re.MULTILINE
-    )
-    
-    return cleaned_text
+    cleaned_metadata = _NUMBERS_SECTION_RE.sub(replace_numbers, updated_metadata)
+    upc_changed = cleaned_metadata != updated_metadata
+    
+    return cleaned_metadata, date_changed, upc, upc_changed
+
+def clean_row(metadata_text):
+    """
+    Clean one metadata entry in a worker process.
+
+    Returns:
+        tuple: (updated_text, date_changed, upc_changed, upc, error_message)
+    """
+    try:
+        updated_metadata, date_changed, upc, upc_changed = clean_metadata_text(metadata_text)
+        return updated_metadata, date_changed, upc_changed, upc, None
+    except Exception as e:
+        return metadata_text, False, False, None, str(e)
 
 def process_excel_file(input_file_path, results_folder_path, workflow_json_path):
     """Process the Excel file containing metadata entries and update it in place."""
-    # Load the workbook
-    wb = openpyxl.load_workbook(input_file_path)
+    # Stream the workbook read-only; changed cells are written back afterwards
+    wb = openpyxl.load_workbook(input_file_path, read_only=True)
     ws = wb.active
     
     # Get the metadata column index
-    headers = [cell.value for cell in ws[1]]
+    headers = next(ws.iter_rows(min_row=1, max_row=1, values_only=True))
     metadata_col_idx = headers.index('AI-Generated Metadata') + 1
     
+    # (row number, cleaned metadata) for every cell that needs rewriting
+    cell_updates = []
+    
+    # Cleaning results for the workflow JSON, written in one pass after the loop
+    pending_json_updates = []
+    
     # Initialize tracking variables
     records_processed = 0
     records_with_upc_changes = 0
@@ -142,93 +208,97 @@ def process_excel_file(input_file_path, results_folder_path, workflow_json_path)
     print(f"Processing file: {input_file_path}")
     print("-" * 50)
     
-    # Process each row
-    for row_idx in range(2, ws.max_row + 1):
-        metadata_cell = ws.cell(row=row_idx, column=metadata_col_idx)
-        barcode = ws.cell(row=row_idx, column=4).value  # Assuming barcode is in column D
+    # Collect (row number, barcode, metadata) for every row with metadata
+    rows = ws.iter_rows(min_row=2, max_col=max(metadata_col_idx, 4), values_only=True)
+    metadata_rows = [
+        (row_idx, row[3], row[metadata_col_idx - 1])  # Assuming barcode is in column D
+        for row_idx, row in enumerate(rows, start=2)
+        if row[metadata_col_idx - 1]
+    ]
+    wb.close()
+    
+    # Clean dates and publication numbers; rows are independent, so large sheets use all cores
+    metadata_values = [metadata for _, _, metadata in metadata_rows]
+    if len(metadata_values) >= PARALLEL_CLEANING_MIN_ROWS:
+        print(f"Using parallel processing ({multiprocessing.cpu_count()} workers)")
+        with ProcessPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
+            cleaned_rows = list(executor.map(clean_row, metadata_values, chunksize=64))
+    else:
+        cleaned_rows = [clean_row(metadata) for metadata in metadata_values]
+    
+    # Record results in the main process
+    for (row_idx, barcode, original_metadata), cleaned in zip(metadata_rows, cleaned_rows):
+        updated_metadata, date_changed, upc_changed, upc, clean_error = cleaned
+        record_barcode = str(barcode) if barcode else f"row_{row_idx}"
         
-        if metadata_cell.value:
-            try:
-                records_processed += 1
-                original_metadata = metadata_cell.value
-                
-                # Clean dates in the metadata
-                updated_metadata = clean_dates_in_metadata(metadata_cell.value)
-                date_changed = updated_metadata != original_metadata
-                
-                # Process UPC
-                upc, upc_error = extract_upc_from_metadata(updated_metadata)
-                upc_changed = False
-                
-                # Only modify the metadata if it contains a numbers section
-                if 'Numbers:' in updated_metadata:
-                    old_numbers_section = updated_metadata
-                    # Replace number section with cleaned version
-                    updated_metadata = re.sub(
-                        r'(Publishers:.*?Numbers:)\s*(.*?)(\n|$)',
-                        lambda m: f"{m.group(1)} {upc if upc else 'Not visible'}{m.group(3)}",
-                        updated_metadata,
-                        flags=re.DOTALL | re.MULTILINE
-                    )
-                    upc_changed = old_numbers_section != updated_metadata
-                
-                # Update the cell with cleaned metadata
-                metadata_cell.value = updated_metadata
-                
-                # Track changes
-                if date_changed:
-                    records_with_date_changes += 1
-                if upc_changed:
-                    records_with_upc_changes += 1
-                
-                # Update JSON workflow with cleaning results
-                try:
-                    from json_workflow import update_record_step15_cleaning
-                    update_record_step15_cleaning(
-                        json_path=workflow_json_path,
-                        barcode=str(barcode) if barcode else f"row_{row_idx}",
-                        changes_made={
-                            "numbers_edited": upc_changed,
-                            "date_edited": date_changed
-                        },
-                        upc_extracted=upc
-                    )
-                except Exception as json_error:
-                    print(f"   JSON logging error for {barcode}: {json_error}")
-                    log_error(
-                        results_folder_path=results_folder_path,
-                        step="step1.5",
-                        barcode=str(barcode) if barcode else f"row_{row_idx}",
-                        error_type="json_update_error",
-                        error_message=str(json_error)
-                    )
-                    
-                # Log significant changes
-                if date_changed or upc_changed:
-                    print(f"  Row {row_idx} (Barcode: {barcode}): " + 
-                          f"{'Date cleaned' if date_changed else ''}" +
-                          f"{', ' if date_changed and upc_changed else ''}" +
-                          f"{'UPC standardized' if upc_changed else ''}")
+        try:
+            records_processed += 1
+            
+            if clean_error is not None:
+                raise ValueError(clean_error)
             
-            except Exception as e:
-                records_with_errors += 1
-                print(f"  Error processing row {row_idx} (Barcode: {barcode}): {str(e)}")
-                
-                # Log error to JSON
-                try:
-                    log_error(
-                        results_folder_path=results_folder_path,
-                        step="step1.5",
-                        barcode=str(barcode) if barcode else f"row_{row_idx}",
-                        error_type="metadata_cleaning_error",
-                        error_message=str(e),
-                        additional_context={
-                            "row_number": row_idx,
-                            "operation": "metadata_cleaning"
-                        }
-                    )
-                except:
-                    pass  # Don't let JSON logging errors break the cleaning process
+            # Queue the cleaned metadata for the write pass
+            if updated_metadata != original_metadata:
+                cell_updates.append((row_idx, updated_metadata))
+            
+            # Track changes
+            if date_changed:
+                records_with_date_changes += 1
+            if upc_changed:
+                records_with_upc_changes += 1
+            
+            # Queue JSON workflow update with cleaning results
+            pending_json_updates.append({
+                "barcode": record_barcode,
+                "changes_made": {
+                    "numbers_edited": upc_changed,
+                    "date_edited": date_changed
+                },
+                "upc_extracted": upc
+            })
+            
+            # Log significant changes
+            if date_changed or upc_changed:
+                print(f"  Row {row_idx} (Barcode: {barcode}): " + 
+                      f"{'Date cleaned' if date_changed else ''}" +
+                      f"{', ' if date_changed and upc_changed else ''}" +
+                      f"{'UPC standardized' if upc_changed else ''}")
+        
+        except Exception as e:
+            records_with_errors += 1
+            print(f"  Error processing row {row_idx} (Barcode: {barcode}): {str(e)}")
+            
+            # Log error to JSON
+            try:
+                log_error(
+                    results_folder_path=results_folder_path,
+                    step="step1.5",
+                    barcode=record_barcode,
+                    error_type="metadata_cleaning_error",
+                    error_message=str(e),
+                    additional_context={
+                        "row_number": row_idx,
+                        "operation": "metadata_cleaning"
+                    }
+                )
+            except:
+                pass  # Don't let JSON logging errors break the cleaning process
+
+    # Update JSON workflow with all cleaning results at once
+    try:
+        update_records_step15_cleaning_bulk(workflow_json_path, pending_json_updates)
+    except Exception as json_error:
+        print(f"   JSON logging error: {json_error}")
+        log_error(
+            results_folder_path=results_folder_path,
+            step="step1.5",
+            barcode="system",
+            error_type="json_update_error",
+            error_message=str(json_error),
+            additional_context={
+                "records_pending": len(pending_json_updates)
+            }
+        )
     
     # Print summary AFTER processing all rows
     print(f"\nCLEANING SUMMARY:")
@@ -257,10 +327,45 @@ def process_excel_file(input_file_path, results_folder_path, workflow_json_path)
     except Exception as metrics_error:
         print(f"Warning: Could not log cleaning metrics: {metrics_error}")
     
-    # Save the updated workbook back to the same file
-    wb.save(input_file_path)
+    # Re-open for writing and touch only the cells that changed
+    if cell_updates:
+        wb = openpyxl.load_workbook(input_file_path)
+        ws = wb.active
+        for row_idx, updated_metadata in cell_updates:
+            ws.cell(row=row_idx, column=metadata_col_idx, value=updated_metadata)
+        
+        # Save the updated workbook back to the same file
+        wb.save(input_file_path)
     print(f"Updated spreadsheet to leave only UPC numbers, EAN numbers, and YYYY dates: {input_file_path}")
 
+def find_input_spreadsheet(results_folder, results_prefix):
+    """
+    Find the full-workflow-data-cd- spreadsheet to clean.
+
+    Step 1 names the spreadsheet with the same timestamp as its results folder,
+    so that file is checked with a single stat before scanning the folder.
+
+    Returns:
+        Path to the spreadsheet, or None if none was found
+    """
+    folder_name = os.path.basename(os.path.normpath(results_folder))
+    folder_prefix = os.path.basename(results_prefix)
+    if folder_name.startswith(folder_prefix):
+        timestamp = folder_name[len(folder_prefix):]
+        expected_file = os.path.join(results_folder, f"full-workflow-data-cd-{timestamp}.xlsx")
+        if os.path.isfile(expected_file):
+            return expected_file
+    
+    # Fall back to the most recently modified matching spreadsheet
+    with os.scandir(results_folder) as entries:
+        input_files = [entry for entry in entries
+                       if entry.name.startswith('full-workflow-data-cd-') and entry.name.endswith('.xlsx')]
+    
+    if not input_files:
+        return None
+    
+    return max(input_files, key=lambda entry: entry.stat().st_mtime).path
+
 def main():
     file_paths = get_file_path_config()
     results_folder = find_latest_results_folder(file_paths["results_prefix"])
@@ -271,10 +376,9 @@ def main():
         return
     
     # Look for previously created spreadsheet in the results folder
-    input_files = [f for f in os.listdir(results_folder) 
-                   if f.startswith('full-workflow-data-cd-') and f.endswith('.xlsx')]
+    input_file = find_input_spreadsheet(results_folder, file_paths["results_prefix"])
     
-    if not input_files:
+    if not input_file:
         error_msg = "No full-workflow-data-cd- files found for cleaning"
         print(f"{error_msg}")
         try:
@@ -289,10 +393,7 @@ def main():
             pass
         return
 
-    latest_file = max(input_files)
-    input_file = os.path.join(results_folder, latest_file)
-
-    print(f"Found file to clean: {latest_file}")
+    print(f"Found file to clean: {os.path.basename(input_file)}")
     
     # Process the file - now passes workflow_json_path
     process_excel_file(input_file, results_folder, workflow_json_path)
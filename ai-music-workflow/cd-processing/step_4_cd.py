@@ -10,7 +10,7 @@ from difflib import SequenceMatcher
 from json_workflow import update_record_step4, update_record_alma_verification, log_error, log_processing_metrics
 from shared_utilities import find_latest_results_folder, get_workflow_json_path, create_batch_summary
 from cd_workflow_config import get_file_path_config, get_threshold_config
-from alma_api_utils import verify_holdings_in_alma
+from alma_api_utils import verify_holdings_in_alma, check_oclcs_in_alma_batch
 
 def extract_tracks_from_metadata(metadata_str):
     """Extract track listings from metadata string."""
@@ -670,6 +670,16 @@ def main():
     print(f"Starting verification for records with confidence ≥ 80% that mention tracks...")
     print(f"Total rows in spreadsheet: {sheet.max_row - 1}")
     
+    # Check every chosen OCLC number against Alma in batched requests up front;
+    # verify_holdings_in_alma in the loop below then answers from the cache
+    oclc_numbers_to_verify = []
+    for row in range(2, sheet.max_row + 1):
+        oclc_number = sheet[f'{OCLC_NUMBER_COLUMN}{row}'].value
+        if oclc_number and str(oclc_number).strip() != "" and oclc_number != "Not found":
+            oclc_numbers_to_verify.append(str(oclc_number).strip())
+    if oclc_numbers_to_verify:
+        check_oclcs_in_alma_batch(oclc_numbers_to_verify)
+    
     for row in range(2, sheet.max_row + 1):
         try:
             metadata = sheet[f'{METADATA_COLUMN}{row}'].value
@@ -0,0 +1,148 @@
+"""
+Tests for split-batch checkpoints in batch_processor.py, run against an in-memory
+stand-in for the OpenAI file and batch endpoints.
+
+Run from cd-processing:  python -m unittest test_batch_processor
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import batch_processor
+from batch_processor import BatchProcessor
+
+
+class _StreamedContent:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def iter_bytes(self):
+        yield self.body
+
+
+class FakeOpenAI:
+    """Completes every batch on its first poll, except those whose input file is in fail_files."""
+
+    def __init__(self):
+        self.files_by_id = {}
+        self.uploads = 0
+        self.fail_files = set()
+        self._lock = threading.Lock()
+        self.files = SimpleNamespace(
+            create=self._create_file,
+            content=lambda file_id: SimpleNamespace(text=self._output(file_id).decode()),
+            with_streaming_response=SimpleNamespace(content=lambda file_id: _StreamedContent(self._output(file_id))),
+        )
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve_batch)
+
+    def _create_file(self, file, purpose):
+        if isinstance(file, tuple):
+            file = file[1]
+        data = file if isinstance(file, bytes) else file.read()
+        with self._lock:
+            self.uploads += 1
+            file_id = f"file{self.uploads}"
+        self.files_by_id[file_id] = data
+        return SimpleNamespace(id=file_id)
+
+    def _create_batch(self, input_file_id, endpoint, completion_window, metadata):
+        return SimpleNamespace(id=f"batch_{input_file_id}", status="validating")
+
+    def _retrieve_batch(self, batch_id):
+        input_file_id = batch_id[len("batch_"):]
+        status = "failed" if input_file_id in self.fail_files else "completed"
+        return SimpleNamespace(
+            id=batch_id, status=status, created_at=0, completed_at=1, metadata={},
+            request_counts=SimpleNamespace(total=1, completed=1, failed=0),
+            output_file_id=f"out_{input_file_id}", error_file_id=None,
+        )
+
+    def _output(self, file_id):
+        requests = self.files_by_id[file_id[len("out_"):]].decode().splitlines()
+        return "".join(
+            json.dumps({
+                "custom_id": json.loads(line)["custom_id"],
+                "response": {"status_code": 200, "body": {"choices": [{"message": {"content": "ok"}}]}},
+            }) + "\n"
+            for line in requests if line.strip()
+        ).encode()
+
+
+class SplitBatchCheckpointTests(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.state_dir, True)
+        self.addCleanup(shutil.rmtree, cache_dir, True)
+        for patcher in (mock.patch.object(batch_processor, "RESULT_CACHE_DIR", cache_dir),
+                        mock.patch.object(batch_processor.time, "sleep", lambda seconds: None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = FakeOpenAI()
+        # ~20 KB per request and a 0.2 MB limit: about ten chunks of ten requests
+        self.requests_data = [{"messages": [{"role": "user", "content": "x" * 19000 + str(i)}]}
+                              for i in range(100)]
+
+    def _processor(self):
+        processor = BatchProcessor(persistence_dir=self.state_dir)
+        processor.client = self.client
+        return processor
+
+    def _submit(self, processor):
+        batch_requests = processor.create_batch_requests(self.requests_data, "cd_metadata")
+        results = processor.submit_adaptive_batch(batch_requests, {}, "test", max_file_size_mb=0.2)
+        return batch_requests, results
+
+    def _run_dirs(self):
+        return [name for name in os.listdir(self.state_dir) if name.startswith("run_")]
+
+    def test_cleanup_keeps_retrieved_chunks_after_partial_failure(self):
+        self.client.fail_files = {"file2"}
+        _, first_results = self._submit(self._processor())
+        first_uploads = self.client.uploads
+        self.assertGreater(first_uploads, 2)
+        self.assertEqual(len(first_results), 100 - 100 // first_uploads)
+
+        # Every chunk is finished, so nothing in the run is tracked any more
+        processor = self._processor()
+        processor.cleanup_completed_batches()
+        self.assertEqual(processor.batch_jobs, {})
+        self.assertEqual(len(self._run_dirs()), 1)
+
+        # The retry only resubmits the failed chunk and returns every result in order
+        self.client.fail_files = set()
+        batch_requests, results = self._submit(self._processor())
+        self.assertEqual(self.client.uploads - first_uploads, 1)
+        self.assertEqual([r["custom_id"] for r in results], [r["custom_id"] for r in batch_requests])
+        self.assertEqual(self._run_dirs(), [])
+
+    def test_cleanup_expires_old_checkpoints(self):
+        self.client.fail_files = {"file2"}
+        self._submit(self._processor())
+        run_dir = os.path.join(self.state_dir, self._run_dirs()[0])
+        expired = time.time() - batch_processor.RESULT_CACHE_MAX_AGE_SECONDS - 60
+        for name in os.listdir(run_dir):
+            os.utime(os.path.join(run_dir, name), (expired, expired))
+
+        self._processor().cleanup_completed_batches()
+        self.assertEqual(self._run_dirs(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()